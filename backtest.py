@@ -0,0 +1,218 @@
+#Read in packages
+import os
+import sqlite3
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+#Scores for each (cutoff, decay_factor, engine) fold are kept here so repeat sweeps only fit new folds
+BACKTEST_DB = "data/backtest.sqlite"
+
+#Default grid of decay factors to compare against the current 0.005
+DECAY_GRID = [0.0, 0.001, 0.0025, 0.005, 0.0075, 0.01, 0.02]
+
+
+def split_fold(results, cutoff):
+    """
+    Split results into the games before a cutoff date and the games played on it.
+
+    'days_since' of the training games is measured from the last training date, as it
+    would have been when fitting the night before the cutoff.
+
+    Parameters:
+    results (DataFrame): Completed games from model_data.prepare_results()
+    cutoff (Timestamp): Date of the games to predict
+
+    Returns:
+    tuple: (data_in, y_1, y_2) for training and the DataFrame of games to score
+    """
+    train = results[results['Date'] < cutoff]
+    test = results[results['Date'] == cutoff]
+    data_in = np.column_stack([
+        train['home_ix'].values,
+        train['away_ix'].values,
+        (train['Date'].max() - train['Date']).dt.days.values,
+    ])
+    return (data_in, train['home_score'].values, train['away_score'].values), test
+
+
+def score_games(samples, games):
+    """
+    Score next-day predictions against what happened.
+
+    Parameters:
+    samples (dict): Posterior samples fitted on games before the test date
+    games (DataFrame): Games on the test date with scores and team indexes
+
+    Returns:
+    dict: Summed log predictive density of the exact scores and summed three-way Brier score
+    """
+    from scipy.stats import poisson
+    from scipy.special import logsumexp
+    from predictions import game_lambdas, outcome_probs
+
+    home_ix = games['home_ix'].values
+    away_ix = games['away_ix'].values
+    home_score = games['home_score'].values
+    away_score = games['away_score'].values
+
+    #Log of the posterior predictive probability of each exact score line
+    home_lambda, away_lambda = game_lambdas(samples, home_ix, away_ix)
+    log_p = poisson.logpmf(home_score, home_lambda) + poisson.logpmf(away_score, away_lambda)
+    log_lik = logsumexp(log_p, axis=0) - np.log(log_p.shape[0])
+
+    #Brier score over home win / tie after regulation / away win
+    probs = np.column_stack(outcome_probs(samples, home_ix, away_ix))
+    outcome = np.column_stack([home_score > away_score, home_score == away_score, home_score < away_score])
+    brier = ((probs - outcome) ** 2).sum(axis=1)
+
+    return {"n_games": len(games), "log_lik": float(log_lik.sum()), "brier": float(brier.sum())}
+
+
+#Completed games, loaded once per process
+_results = None
+
+#Set in worker processes, which rebuild the games from the pages the parent already saved
+#instead of scraping again
+_offline = False
+
+
+def _init_worker():
+    global _offline
+    _offline = True
+
+
+def load_results():
+    """Completed games from the game store, built on first use in each process."""
+    global _results
+    if _results is None:
+        from build_data import build_games
+        from model_data import prepare_results
+
+        _results = prepare_results(build_games(offline=True) if _offline else build_games())
+    return _results
+
+
+def score_fold(cutoff, decay, engine):
+    """
+    Fit the model on games before cutoff with the given decay factor and score the cutoff date.
+
+    Runs in worker processes, so model_data is imported here rather than at module level.
+    """
+    import model_data
+
+    cutoff = pd.Timestamp(cutoff)
+    (data_in, y_1, y_2), test = split_fold(load_results(), cutoff)
+    if engine == "nuts":
+        samples = model_data.fit_model(data_in, y_1, y_2, decay_factor=decay).get_samples()
+    else:
+        samples, _ = model_data.fit_approximate(data_in, y_1, y_2, engine, decay_factor=decay)
+    return dict(score_games(samples, test), cutoff=cutoff.strftime('%Y-%m-%d'), decay=decay, engine=engine)
+
+
+def choose_cutoffs(results, n_cutoffs, season=None):
+    """Evenly spaced game dates from a season (the latest by default) to use as cutoffs."""
+    season = season or results['Season'].max()
+    dates = np.sort(results.loc[results['Season'] == season, 'Date'].unique())
+    #Skip the first week of the season so every fold has some current-season games to learn from
+    dates = dates[7:]
+    if len(dates) == 0:
+        return []
+    picks = np.unique(np.linspace(0, len(dates) - 1, min(n_cutoffs, len(dates))).round().astype(int))
+    return [pd.Timestamp(date).strftime('%Y-%m-%d') for date in dates[picks]]
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS folds (
+            cutoff TEXT NOT NULL,
+            decay REAL NOT NULL,
+            engine TEXT NOT NULL,
+            n_games INTEGER NOT NULL,
+            log_lik REAL NOT NULL,
+            brier REAL NOT NULL,
+            PRIMARY KEY (cutoff, decay, engine)
+        )
+    """)
+    return con
+
+
+def run_backtest(cutoffs, decays=DECAY_GRID, engine="svi", workers=1, db_path=BACKTEST_DB):
+    """
+    Score every (cutoff, decay) fold, fitting only folds missing from the cache.
+
+    Parameters:
+    cutoffs (list): Dates ('YYYY-MM-DD') whose games are predicted from the games before them
+    decays (list): Decay factors to compare
+    engine (str): "nuts", "svi" or "svi_mvn" - the svi engines make wide sweeps affordable
+    workers (int): Number of processes to fit folds in
+    db_path (str): SQLite cache of fold scores
+
+    Returns:
+    DataFrame: One row per fold
+    """
+    con = _connect(db_path)
+    try:
+        done = {
+            (cutoff, decay)
+            for cutoff, decay in con.execute("SELECT cutoff, decay FROM folds WHERE engine = ?", (engine,))
+        }
+        todo = [(cutoff, float(decay)) for cutoff in cutoffs for decay in decays if (cutoff, float(decay)) not in done]
+        print(f"{len(todo)} folds to fit, {len(cutoffs) * len(decays) - len(todo)} cached")
+
+        def store(row):
+            with con:
+                con.execute(
+                    "INSERT OR REPLACE INTO folds (cutoff, decay, engine, n_games, log_lik, brier) VALUES (?, ?, ?, ?, ?, ?)",
+                    (row["cutoff"], row["decay"], row["engine"], row["n_games"], row["log_lik"], row["brier"]),
+                )
+
+        if workers > 1 and todo:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+                futures = [pool.submit(score_fold, cutoff, decay, engine) for cutoff, decay in todo]
+                for future in futures:
+                    store(future.result())
+        else:
+            for cutoff, decay in todo:
+                store(score_fold(cutoff, decay, engine))
+
+        placeholders = ",".join("?" * len(cutoffs))
+        folds = pd.read_sql_query(
+            f"SELECT * FROM folds WHERE engine = ? AND cutoff IN ({placeholders})",
+            con,
+            params=[engine, *cutoffs],
+        )
+    finally:
+        con.close()
+
+    return folds[folds['decay'].isin([float(decay) for decay in decays])]
+
+
+def summarise(folds):
+    """Per-game log-likelihood and Brier score for each decay factor, best first."""
+    summary = folds.groupby('decay')[['n_games', 'log_lik', 'brier']].sum()
+    summary['log_lik_per_game'] = summary['log_lik'] / summary['n_games']
+    summary['brier_per_game'] = summary['brier'] / summary['n_games']
+    return summary[['n_games', 'log_lik_per_game', 'brier_per_game']].sort_values('log_lik_per_game', ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of decay_factor")
+    parser.add_argument("--decays", type=float, nargs="+", default=DECAY_GRID, help="decay factors to compare")
+    parser.add_argument("--cutoffs", type=int, default=20, help="number of cutoff dates in the season")
+    parser.add_argument("--season", type=int, default=None, help="season to take cutoffs from, latest by default")
+    parser.add_argument("--engine", default="svi", choices=["nuts", "svi", "svi_mvn"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    results = load_results()
+    cutoffs = choose_cutoffs(results, args.cutoffs, args.season)
+    folds = run_backtest(cutoffs, args.decays, args.engine, args.workers)
+    summary = summarise(folds)
+    summary.to_csv("data/backtest_summary.csv")
+    print(summary)
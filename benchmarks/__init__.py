@@ -0,0 +1 @@
+"""Offline benchmarks of the daily job, run with `python -m benchmarks.run` from the repo root."""
@@ -0,0 +1,80 @@
+#Read in packages
+import numpy as np
+import pandas as pd
+
+#Synthetic seasons built from formatting/teams.csv, so benchmarks never touch the network.
+#Scores are Poisson draws around the long-run NHL average of about 3 goals a side.
+
+
+def synthetic_raw_games(n_games, played_fraction=0.6, season=2025, seed=0, teams_path="formatting/teams.csv"):
+    """
+    A schedule in the raw hockey-reference layout, the first played_fraction of it with scores.
+
+    Parameters:
+    n_games (int): Number of games in the schedule
+    played_fraction (float): Share of the games that have been played
+    season (int): Season to stamp the games with
+    seed (int): Seed for the schedule and scores
+    teams_path (str): Team list to draw matchups from
+
+    Returns:
+    DataFrame: Columns Date, Visitor, G, Home, G.1, Shootout and Season
+    """
+    rng = np.random.default_rng(seed)
+    names = pd.read_csv(teams_path)['team'].values
+    n_teams = len(names)
+
+    #Roughly 8 games a night from early October
+    dates = pd.date_range(f"{season - 1}-10-05", periods=n_games // 8 + 1, freq="D").repeat(8)[:n_games]
+    home = rng.integers(0, n_teams, n_games)
+    away = (home + rng.integers(1, n_teams, n_games)) % n_teams
+
+    strength = rng.normal(0, 0.15, n_teams)
+    home_goals = rng.poisson(np.exp(1.1 + strength[home] - strength[away])).astype(float)
+    away_goals = rng.poisson(np.exp(1.05 + strength[away] - strength[home])).astype(float)
+
+    #Ties go to overtime or a shootout, where the winner is credited one extra goal
+    tied = home_goals == away_goals
+    shootout = np.where(tied, np.where(rng.uniform(size=n_games) < 0.344, "SO", "OT"), None)
+    home_won_extra = rng.uniform(size=n_games) < 0.5
+    home_goals[tied & home_won_extra] += 1
+    away_goals[tied & ~home_won_extra] += 1
+
+    games = pd.DataFrame({
+        'Date': dates.strftime('%Y-%m-%d'),
+        'Visitor': names[away],
+        'G': away_goals,
+        'Home': names[home],
+        'G.1': home_goals,
+        'Shootout': shootout,
+        'Season': season,
+    })
+
+    unplayed = np.arange(n_games) >= int(n_games * played_fraction)
+    games.loc[unplayed, ['G', 'G.1', 'Shootout']] = np.nan
+    return games
+
+
+def synthetic_games(n_games, played_fraction=0.6, season=2025, seed=0):
+    """Synthetic schedule run through build_data.process_games, as returned by build_games()."""
+    from build_data import process_games
+
+    return process_games(synthetic_raw_games(n_games, played_fraction, season, seed))
+
+
+def synthetic_posterior(n_draws, n_teams=32, seed=0):
+    """
+    Posterior-shaped samples for benchmarking prediction without fitting first.
+
+    Returns:
+    dict: 'atts', 'defs', 'home' and 'intercerpt' arrays with n_draws rows
+    """
+    rng = np.random.default_rng(seed)
+    atts = rng.normal(0, 0.1, (n_draws, n_teams))
+    defs = rng.normal(0, 0.1, (n_draws, n_teams))
+    return {
+        'atts': (atts - atts.mean(axis=1, keepdims=True)).astype(np.float32),
+        'defs': (defs - defs.mean(axis=1, keepdims=True)).astype(np.float32),
+        'home': rng.normal(0.05, 0.02, n_draws).astype(np.float32),
+        'intercerpt': rng.normal(1.05, 0.02, n_draws).astype(np.float32),
+    }
@@ -0,0 +1,150 @@
+#Read in packages
+import os
+import json
+import time
+import argparse
+import datetime
+import numpy as np
+from benchmarks.fixtures import synthetic_games, synthetic_posterior
+from pipeline import peak_rss_mb
+
+#Where results are written, so runs can be compared over time
+BENCHMARK_PATH = "data/benchmark_report.json"
+
+#Games in a full regular season
+SEASON_GAMES = 1312
+
+
+def time_call(func, repeat=3):
+    """
+    Time a call, keeping the first run apart as it includes any JAX compilation.
+
+    Returns:
+    dict: first_seconds, best_seconds over the later runs and peak_rss_mb afterwards
+    """
+    start = time.perf_counter()
+    func()
+    first = time.perf_counter() - start
+
+    best = None
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {"first_seconds": first, "best_seconds": first if best is None else best, "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_fit(n_games, num_warmup, num_samples, likelihood):
+    """NUTS on the model with the given likelihood, with warmup (which includes compilation) and sampling timed apart."""
+    from jax import random
+    from numpyro.infer import MCMC, NUTS
+    from model_data import model_and_args, model_inputs, prepare_results
+
+    games = synthetic_games(n_games, played_fraction=1.0)
+    model, model_args = model_and_args(*model_inputs(prepare_results(games)), likelihood)
+
+    mcmc = MCMC(NUTS(model), num_warmup=num_warmup, num_samples=num_samples, progress_bar=False)
+    start = time.perf_counter()
+    mcmc.warmup(random.PRNGKey(0), **model_args)
+    warmup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mcmc.run(mcmc.post_warmup_state.rng_key, **model_args)
+    sample = time.perf_counter() - start
+
+    return {
+        "n_games": n_games,
+        "likelihood": likelihood,
+        "num_warmup": num_warmup,
+        "num_samples": num_samples,
+        "warmup_seconds": warmup,
+        "sample_seconds": sample,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_predict(n_games, n_draws, repeat):
+    """predictions.sim_schedule_left on an unplayed schedule of n_games."""
+    from predictions import sim_schedule_left
+
+    schedule = synthetic_games(n_games, played_fraction=0.0)
+    samples = synthetic_posterior(n_draws)
+    return dict(time_call(lambda: sim_schedule_left(schedule, samples), repeat), n_games=n_games, n_draws=n_draws)
+
+
+def bench_sim_results(n_games, n_draws, repeat):
+    """projections.simResults on simulated goals for n_games and n_draws."""
+    import pandas as pd
+    from projections import simResults
+
+    teams = pd.read_csv("formatting/teams.csv")
+    schedule = synthetic_games(n_games, played_fraction=0.0)
+    rng = np.random.default_rng(0)
+    home_goals = rng.poisson(3.1, (n_games, n_draws))
+    away_goals = rng.poisson(2.9, (n_games, n_draws))
+    return dict(
+        time_call(lambda: simResults(schedule, home_goals, away_goals, teams), repeat),
+        n_games=n_games,
+        n_draws=n_draws,
+    )
+
+
+def bench_standings(n_games, repeat):
+    """update_db.create_team_stats_table on a season with n_games played."""
+    import pandas as pd
+    from update_db import create_team_stats_table
+
+    teams = pd.read_csv("formatting/teams.csv")
+    games = synthetic_games(n_games, played_fraction=1.0)
+    return dict(time_call(lambda: create_team_stats_table(games, teams), repeat), n_games=n_games)
+
+
+def run_benchmarks(sizes, draws, fit_sizes, num_warmup=500, num_samples=1000, repeat=3):
+    """
+    Run every benchmark over the given schedule sizes and draw counts.
+
+    Parameters:
+    sizes (list): Numbers of games for the prediction, simulation and standings benchmarks
+    draws (list): Numbers of posterior draws for the prediction and simulation benchmarks
+    fit_sizes (list): Numbers of played games to fit the model on, with each likelihood
+    num_warmup (int): NUTS warmup steps per fit
+    num_samples (int): NUTS samples per fit
+    repeat (int): Runs per case, the first being reported separately
+
+    Returns:
+    dict: Results per benchmark
+    """
+    report = {"date": datetime.datetime.now().isoformat(timespec="seconds"), "fit": [], "predict": [], "sim_results": [], "standings": []}
+    for n_games in fit_sizes:
+        for likelihood in ["games", "pairs"]:
+            report["fit"].append(bench_fit(n_games, num_warmup, num_samples, likelihood))
+            print(report["fit"][-1])
+    for n_games in sizes:
+        for n_draws in draws:
+            report["predict"].append(bench_predict(n_games, n_draws, repeat))
+            print(report["predict"][-1])
+            report["sim_results"].append(bench_sim_results(n_games, n_draws, repeat))
+            print(report["sim_results"][-1])
+        report["standings"].append(bench_standings(n_games, repeat))
+        print(report["standings"][-1])
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the daily job on synthetic schedules")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 600, SEASON_GAMES], help="schedule sizes in games")
+    parser.add_argument("--draws", type=int, nargs="+", default=[500, 2000], help="posterior draw counts")
+    parser.add_argument("--fit-sizes", type=int, nargs="*", default=[600, 4 * SEASON_GAMES], help="played games to fit on")
+    parser.add_argument("--num-warmup", type=int, default=500)
+    parser.add_argument("--num-samples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=BENCHMARK_PATH)
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.sizes, args.draws, args.fit_sizes, args.num_warmup, args.num_samples, args.repeat)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
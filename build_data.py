@@ -1,62 +1,219 @@
+import os
+import sqlite3
+import urllib.request
+from io import StringIO
 import pandas as pd
 import numpy as np
 
 #Read in teams data for later use
 teams = pd.read_csv("formatting/teams.csv")
 
-# Initialize an empty DataFrame to store all data
-data_hr = pd.DataFrame()
+#Seasons to model - 2022 to 2025 inclusive, the last one is the current season
+SEASONS = range(2022, 2026)
 
-for year in range(2022, 2026):  # Loop from 2022 to 2025 inclusive
-    url = f'https://www.hockey-reference.com/leagues/NHL_{year}_games.html'
-    data_year = pd.read_html(url)
-    
+#Local store of scraped games and the raw pages they came from
+GAMES_DB = "data/games.sqlite"
+HTML_DIR = "data/html"
+
+#Set FACEOFF_OFFLINE=1 to build from saved pages in HTML_DIR without touching the network
+OFFLINE = os.getenv("FACEOFF_OFFLINE") == "1"
+
+#Columns kept from the hockey-reference games table
+GAME_COLUMNS = ['Date', 'Visitor', 'G', 'Home', 'G.1', 'Shootout', 'Season']
+
+
+def season_url(year):
+    return f'https://www.hockey-reference.com/leagues/NHL_{year}_games.html'
+
+
+def season_html_path(year, html_dir=HTML_DIR):
+    return os.path.join(html_dir, f'NHL_{year}_games.html')
+
+
+def fetch_season_html(year, offline=OFFLINE, html_dir=HTML_DIR):
+    """
+    Get the hockey-reference games page for a season.
+
+    Online, the page is downloaded and saved to html_dir so it can be replayed later.
+    Offline, the saved page is read instead.
+
+    Parameters:
+    year (int): Season to fetch, e.g. 2025 for 2024-25
+    offline (bool): Read the saved page instead of downloading
+    html_dir (str): Directory of saved pages
+
+    Returns:
+    str: Page HTML
+    """
+    path = season_html_path(year, html_dir)
+    if offline:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Offline mode but no saved page for {year} at {path}")
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    with urllib.request.urlopen(season_url(year)) as response:
+        html = response.read().decode("utf-8")
+
+    os.makedirs(html_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(html)
+    return html
+
+
+def parse_season(html, year):
+    """Parse the games table from a season page into GAME_COLUMNS."""
     # Assuming the table you're interested in is the first one
-    df_year = data_year[0]
-    
-    # Renaming 'Unnamed: 5' to 'Shootout'
+    df_year = pd.read_html(StringIO(html))[0]
+
+    # Renaming 'Unnamed: 6' to 'Shootout'
     df_year = df_year.rename(columns={'Unnamed: 6': 'Shootout'})
-    
+
     # Adding a column for the season year
     df_year['Season'] = year
-    
-    # Concatenating the yearly data to the main DataFrame
-    data_hr = pd.concat([data_hr, df_year], ignore_index=True)
-
-#Convert 'Date column to datetime'
-data_hr['Date'] = pd.to_datetime(data_hr['Date'])
-
-# Creating 'home_score' and 'away_score' columns
-data_hr['home_score'] = data_hr['G.1']
-data_hr['away_score'] = data_hr['G']
-
-#Replace Arizona with Utah
-data_hr['Home'] = data_hr['Home'].replace('Arizona Coyotes', 'Utah Hockey Club')
-data_hr['Visitor'] = data_hr['Visitor'].replace('Arizona Coyotes', 'Utah Hockey Club')
-
-
-# Adjusting scores based on 'Shootout'
-# Loop through each row to check for shootout condition and adjust scores
-for index, row in data_hr.iterrows():
-    if pd.notnull(row['Shootout']):  # Check if 'Shootout' is not NaN
-        # Find the max score to determine the winner in shootout cases
-        max_score = max(row['home_score'], row['away_score'])
-        
-        # If it's a shootout, the winning score should be reduced by 1
-        # since one goal is added to the winning team's score in a shootout win
-        if row['home_score'] == max_score:
-            data_hr.at[index, 'home_score'] = row['home_score'] - 1
-        else:
-            data_hr.at[index, 'away_score'] = row['away_score'] - 1
-
-#Create new columns home_ix, away_ix which provides corresponding team index for each match
-data_hr = (
-    data_hr.merge(teams[['team','team_index']], left_on="Home", right_on="team")
-    .rename(columns={"team_index": "home_ix"})
-    .drop(["team"], axis=1)
-    .merge(teams[['team','team_index']], left_on="Visitor", right_on="team")
-    .rename(columns={"team_index": "away_ix"})
-    .drop(["team"], axis=1)
-)
+
+    return df_year[GAME_COLUMNS]
+
+
+def _connect(db_path):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS games (
+            "Season" INTEGER NOT NULL,
+            "Date" TEXT NOT NULL,
+            "Visitor" TEXT NOT NULL,
+            "G" REAL,
+            "Home" TEXT NOT NULL,
+            "G.1" REAL,
+            "Shootout" TEXT,
+            UNIQUE ("Season", "Date", "Home", "Visitor")
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS seasons (
+            "Season" INTEGER PRIMARY KEY,
+            "complete" INTEGER NOT NULL
+        )
+    """)
+    return con
+
+
+def store_season(con, df_year, year):
+    """Replace a season's games in the store and record whether it has finished."""
+    rows = df_year[GAME_COLUMNS].astype(object).where(df_year[GAME_COLUMNS].notna(), None)
+    complete = bool(df_year['G'].notna().all() and df_year['G.1'].notna().all())
+    with con:
+        con.execute('DELETE FROM games WHERE "Season" = ?', (year,))
+        con.executemany(
+            'INSERT OR REPLACE INTO games ("Date", "Visitor", "G", "Home", "G.1", "Shootout", "Season") '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            rows.itertuples(index=False, name=None),
+        )
+        con.execute(
+            'INSERT OR REPLACE INTO seasons ("Season", "complete") VALUES (?, ?)',
+            (year, int(complete)),
+        )
+
+
+def load_games(seasons=SEASONS, db_path=GAMES_DB, offline=OFFLINE):
+    """
+    Load raw games for the given seasons, scraping only seasons that are not yet complete.
+
+    Completed seasons are kept in the store permanently, so a daily run only re-fetches
+    the current season page.
+
+    Parameters:
+    seasons (iterable): Seasons to load
+    db_path (str): SQLite game store
+    offline (bool): Use saved pages instead of the network for seasons that need fetching
+
+    Returns:
+    DataFrame: Raw games with GAME_COLUMNS
+    """
+    seasons = list(seasons)
+    con = _connect(db_path)
+    try:
+        complete = {
+            row[0] for row in con.execute('SELECT "Season" FROM seasons WHERE complete = 1')
+        }
+        for year in seasons:
+            if year in complete:
+                continue
+            df_year = parse_season(fetch_season_html(year, offline=offline), year)
+            store_season(con, df_year, year)
+
+        placeholders = ",".join("?" * len(seasons))
+        data = pd.read_sql_query(
+            f'SELECT * FROM games WHERE "Season" IN ({placeholders}) ORDER BY "Season", "Date", rowid',
+            con,
+            params=seasons,
+        )
+    finally:
+        con.close()
+
+    for col in ['G', 'G.1']:
+        data[col] = pd.to_numeric(data[col])
+    return data[GAME_COLUMNS]
+
+
+def process_games(data_hr):
+    """Add model columns (scores with shootout goals removed, team indexes) to raw games."""
+    data_hr = data_hr.copy()
+
+    #Convert 'Date column to datetime'
+    data_hr['Date'] = pd.to_datetime(data_hr['Date'])
+
+    # Creating 'home_score' and 'away_score' columns
+    data_hr['home_score'] = data_hr['G.1']
+    data_hr['away_score'] = data_hr['G']
+
+    #Replace Arizona with Utah
+    data_hr['Home'] = data_hr['Home'].replace('Arizona Coyotes', 'Utah Hockey Club')
+    data_hr['Visitor'] = data_hr['Visitor'].replace('Arizona Coyotes', 'Utah Hockey Club')
+
+
+    # Adjusting scores based on 'Shootout'
+    # Loop through each row to check for shootout condition and adjust scores
+    for index, row in data_hr.iterrows():
+        if pd.notnull(row['Shootout']):  # Check if 'Shootout' is not NaN
+            # Find the max score to determine the winner in shootout cases
+            max_score = max(row['home_score'], row['away_score'])
+
+            # If it's a shootout, the winning score should be reduced by 1
+            # since one goal is added to the winning team's score in a shootout win
+            if row['home_score'] == max_score:
+                data_hr.at[index, 'home_score'] = row['home_score'] - 1
+            else:
+                data_hr.at[index, 'away_score'] = row['away_score'] - 1
+
+    #Create new columns home_ix, away_ix which provides corresponding team index for each match
+    data_hr = (
+        data_hr.merge(teams[['team','team_index']], left_on="Home", right_on="team")
+        .rename(columns={"team_index": "home_ix"})
+        .drop(["team"], axis=1)
+        .merge(teams[['team','team_index']], left_on="Visitor", right_on="team")
+        .rename(columns={"team_index": "away_ix"})
+        .drop(["team"], axis=1)
+    )
+    return data_hr
+
+
+def build_games(seasons=SEASONS, db_path=GAMES_DB, offline=OFFLINE):
+    """
+    Load and process every game for the given seasons, played and still to play.
+
+    Parameters:
+    seasons (iterable): Seasons to load
+    db_path (str): SQLite game store
+    offline (bool): Use saved pages instead of the network for seasons that need fetching
+
+    Returns:
+    DataFrame: Games with scores (NaN for games not yet played) and team indexes
+    """
+    return process_games(load_games(seasons, db_path, offline))
 
 
+if __name__ == "__main__":
+    data_hr = build_games()
+    print(f"{data_hr['home_score'].notna().sum()} games played, {data_hr['home_score'].isna().sum()} left")
@@ -0,0 +1,33 @@
+#Read in packages
+import os
+
+#JAX's persistent XLA compilation cache, kept between runs (the GitHub workflow restores it)
+#so a fresh process loads the compiled NUTS and simulation kernels rather than compiling
+#them again. Set FACEOFF_JAX_CACHE to an empty string to turn it off.
+JAX_CACHE_DIR = os.getenv("FACEOFF_JAX_CACHE", "data/jax_cache")
+
+#Kernels that compile faster than this aren't worth a cache entry
+MIN_COMPILE_SECONDS = 0.0
+
+_enabled = False
+
+
+def enable_compilation_cache(path=JAX_CACHE_DIR):
+    """
+    Point JAX's persistent compilation cache at path, once per process.
+
+    Has to run before the first kernel is compiled. Called on import of model_data and
+    before predictions builds its kernel, so it never has to be called directly.
+
+    Parameters:
+    path (str): Cache directory, created if needed
+    """
+    global _enabled
+    if _enabled or not path:
+        return
+    import jax
+
+    os.makedirs(path, exist_ok=True)
+    jax.config.update("jax_compilation_cache_dir", os.path.abspath(path))
+    jax.config.update("jax_persistent_cache_min_compile_time_secs", MIN_COMPILE_SECONDS)
+    _enabled = True
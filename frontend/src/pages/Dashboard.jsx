@@ -13,7 +13,7 @@ import {
   useColorModeValue
 } from '@chakra-ui/react';
 import { Link } from 'react-router-dom';
-import supabase from '../supabaseClient';
+import { loadSnapshot } from '../snapshot';
 import { FaHockeyPuck, FaChartLine, FaTrophy } from 'react-icons/fa';
 import * as d3 from 'd3';
 
@@ -29,61 +29,17 @@ export default function Dashboard() {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        // Get latest 32 records from team_strengths (ordered by Date descending)
-        const { data: strengthsData, error: strengthsError } = await supabase
-          .from('team_strengths')
-          .select('*')
-          .order('Date', { ascending: false })
-          .limit(32);
-        
-        // Get latest 32 records from team_points (ordered by Date descending)
-        const { data: pointsData, error: pointsError } = await supabase
-          .from('team_points')
-          .select('*')
-          .order('date', { ascending: false })
-          .limit(32);
-        
-        if (strengthsError || pointsError) {
-          console.error('Error fetching data:', strengthsError || pointsError);
-          setLoading(false);
-          return;
-        }
-        
-        // Get top 3 offensive teams from the latest 32 records
-        const topOffensiveTeams = [...strengthsData]
-          .sort((a, b) => b['Mean Attack Rating'] - a['Mean Attack Rating'])
-          .slice(0, 3);
-        
-        // Get top 3 defensive teams from the latest 32 records
-        const topDefensiveTeams = [...strengthsData]
-          .sort((b, a) => b['Mean Defense Rating'] - a['Mean Defense Rating'])
-          .slice(0, 3);
-        
-        // Process points data for top 3 teams
-        const processedPointsData = pointsData.map(item => {
-          // Parse points string to array and calculate mean
-          const pointsArray = JSON.parse(item.points.replace(/'/g, '"'));
-          const sum = pointsArray.reduce((acc, val) => acc + Number(val), 0);
-          const mean = sum / pointsArray.length;
-          
-          return {
-            ...item,
-            meanPoints: parseFloat(mean.toFixed(1))
-          };
-        }).sort((a, b) => b.meanPoints - a.meanPoints).slice(0, 3);
-        
-        // Get latest update timestamp
-        if (strengthsData && strengthsData.length > 0) {
-          setLatestUpdate(new Date(strengthsData[0].Date));
-        }
-        
-        // Set state with top teams
+        // Top teams are picked by the daily job (snapshot.py), so this is one cached file
+        const snapshot = await loadSnapshot();
+        const { dashboard } = snapshot;
+
+        setLatestUpdate(new Date(snapshot.date));
         setTopTeams({
-          offensive: topOffensiveTeams,
-          defensive: topDefensiveTeams,
-          points: processedPointsData
+          offensive: dashboard.top_offense,
+          defensive: dashboard.top_defense,
+          points: dashboard.top_points
         });
-        
+
         setLoading(false);
       } catch (error) {
         console.error('Error in fetchData:', error);
@@ -175,12 +131,12 @@ export default function Dashboard() {
             borderColor="gray.200"
           >
             <Text fontWeight="bold">
-              {idx + 1}. {team.Team || team.team}
+              {idx + 1}. {team.team}
             </Text>
             <Text>
               {isPoints ? 
-                team.meanPoints : 
-                parseFloat(team[metric]).toFixed(2)}
+                team.mean_points : 
+                team[metric].toFixed(2)}
             </Text>
           </Flex>
         ))
@@ -230,12 +186,12 @@ export default function Dashboard() {
       <SimpleGrid columns={{ base: 1, md: 3 }} spacing={10}>
         <TeamRankingList 
           teams={topTeams.offensive} 
-          metric="Mean Attack Rating" 
+          metric="attack" 
           title="Top Offensive Teams" 
         />
         <TeamRankingList 
           teams={topTeams.defensive} 
-          metric="Mean Defense Rating" 
+          metric="defense" 
           title="Top Defensive Teams" 
         />
         <TeamRankingList 
@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { Box, Flex, Heading } from '@chakra-ui/react';
-import supabase from '../supabaseClient';
+import { loadSnapshot } from '../snapshot';
 import teamColours from '../../data/teamcolours'; 
 import teamAbbr from '../../data/teamabbreviations';
 import * as d3 from 'd3';
@@ -19,26 +19,23 @@ export default function Performance() {
 
   useEffect(() => {
     const fetchData = async () => {
-      let { data: fetchedData, error } = await supabase
-        .from('team_strengths')
-        .select('*')
-        .order('Date', { ascending: false })
-        .limit(32);
-
-      if (error) {
+      let snapshot;
+      try {
+        snapshot = await loadSnapshot();
+      } catch (error) {
         console.error('error', error);
         return;
       }
 
-      // Adjusted: Prepare data correctly and set it
-      const preparedData = fetchedData.map(item => ({
-        x: parseFloat(item['Mean Attack Rating'].toFixed(5)), // Ensure numerical value
-        y: parseFloat(item['Mean Defense Rating'].toFixed(5)), // Ensure numerical value
-        team: item['Team'],
-        date: item['Date']
+      // Latest ratings, already rounded by the daily job (snapshot.py)
+      const preparedData = snapshot.performance.ratings.map(item => ({
+        x: item.attack,
+        y: item.defense,
+        team: item.team,
+        date: snapshot.date
       }));
 
-      setData(preparedData); // Use preparedData
+      setData(preparedData);
     };
 
     fetchData();
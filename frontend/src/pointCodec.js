@@ -0,0 +1,45 @@
+// Decoding for the points column of team_points and the scenario odds, mirroring point_codec.py.
+// Values are "<format>:<base64 payload>", little-endian:
+//   hist - uint32 lowest points total followed by uint32 counts for every total from there up
+//   i16  - int16 samples in draw order, only found in older rows
+// Older rows hold a stringified list like "[84.0,77.0,...]".
+
+const base64ToView = (payload) => {
+    const binary = atob(payload);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+        bytes[i] = binary.charCodeAt(i);
+    }
+    return new DataView(bytes.buffer);
+};
+
+// Returns the simulated season point totals as an array of numbers
+export function decodePoints(value) {
+    if (Array.isArray(value)) return value;
+    if (value.startsWith('[')) return JSON.parse(value.replace(/'/g, '"'));
+
+    const split = value.indexOf(':');
+    const format = value.slice(0, split);
+    const view = base64ToView(value.slice(split + 1));
+
+    if (format === 'i16') {
+        const points = new Array(view.byteLength / 2);
+        for (let i = 0; i < points.length; i++) {
+            points[i] = view.getInt16(2 * i, true);
+        }
+        return points;
+    }
+
+    if (format === 'hist') {
+        const points = [];
+        if (view.byteLength === 0) return points;
+        const low = view.getUint32(0, true);
+        for (let i = 1; i < view.byteLength / 4; i++) {
+            const count = view.getUint32(4 * i, true);
+            for (let j = 0; j < count; j++) points.push(low + i - 1);
+        }
+        return points;
+    }
+
+    throw new Error(`Unknown points encoding '${format}'`);
+}
@@ -0,0 +1,34 @@
+// Loads the daily snapshot written by snapshot.py: a small manifest (latest.json) names the
+// current content-hashed snapshot file, which never changes once published and so is served
+// from the browser cache after the first visit. Every page shares one request per page load.
+import supabase from './supabaseClient';
+
+const BUCKET = 'snapshots';
+// Matches SNAPSHOT_VERSION in snapshot.py
+const SNAPSHOT_VERSION = 1;
+
+let snapshotPromise = null;
+
+const publicUrl = (name) => supabase.storage.from(BUCKET).getPublicUrl(name).data.publicUrl;
+
+const fetchJson = async (name, options) => {
+    const response = await fetch(publicUrl(name), options);
+    if (!response.ok) throw new Error(`Failed to fetch ${name}: ${response.status}`);
+    return response.json();
+};
+
+export function loadSnapshot() {
+    if (!snapshotPromise) {
+        snapshotPromise = (async () => {
+            // Revalidate the manifest every time, the hashed file it names is immutable
+            const manifest = await fetchJson('latest.json', { cache: 'no-cache' });
+            if (manifest.version !== SNAPSHOT_VERSION) {
+                throw new Error(`Unsupported snapshot version ${manifest.version}`);
+            }
+            return fetchJson(manifest.file);
+        })();
+        // Let a later call retry after a failure
+        snapshotPromise.catch(() => { snapshotPromise = null; });
+    }
+    return snapshotPromise;
+}
@@ -0,0 +1,294 @@
+#Read in packages
+import os
+import json
+import argparse
+import datetime
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+from posterior import engine_posterior_path, load_posterior
+from predictions import game_lambdas, outcome_probs
+from projections import SHOOTOUT_PROB, HOME_SO_WIN_PROB, HOME_OT_WIN_PROB
+
+teams = pd.read_csv("formatting/teams.csv")
+
+#Score distributions cover 0 to MAX_GOALS goals a side
+MAX_GOALS = 10
+
+#Matchups kept in memory - 32 x 31 covers every pairing
+CACHE_SIZE = 1024
+
+
+def team_index(value):
+    """Team index from an index, abbreviation or full name."""
+    value = str(value).strip()
+    if value.isdigit() and int(value) in set(teams['team_index']):
+        return int(value)
+    for column in ['abbr', 'team']:
+        #Some entries in teams.csv carry stray spaces, e.g. " UTA"
+        match = teams[teams[column].str.strip().str.lower() == value.lower()]
+        if len(match):
+            return int(match['team_index'].iloc[0])
+    raise ValueError(f"Unknown team '{value}'")
+
+
+def matchup_predictions(samples, home_ix, away_ix):
+    """
+    Outcome probabilities and score distributions for any number of games at once.
+
+    Regulation results come from the exact Skellam distribution of the goal difference
+    for each posterior draw. Games tied after regulation are split between overtime and
+    a shootout with the same probabilities projections.simResults uses.
+
+    Parameters:
+    samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    home_ix (array): Home team index per game
+    away_ix (array): Away team index per game
+
+    Returns:
+    dict: Arrays with one value (or row) per game
+    """
+    from scipy.stats import poisson
+
+    home_ix = np.asarray(home_ix)
+    away_ix = np.asarray(away_ix)
+    home_lambda, away_lambda = game_lambdas(samples, home_ix, away_ix)
+    p_home, p_tie, p_away = outcome_probs(samples, home_ix, away_ix)
+
+    home_extra_prob = SHOOTOUT_PROB * HOME_SO_WIN_PROB + (1 - SHOOTOUT_PROB) * HOME_OT_WIN_PROB
+
+    #Posterior mean of each side's goal distribution, and of the joint score grid
+    goals = np.arange(MAX_GOALS + 1)
+    home_pmf = poisson.pmf(goals[:, None, None], home_lambda[None])
+    away_pmf = poisson.pmf(goals[:, None, None], away_lambda[None])
+    score_probs = np.einsum('hdg,adg->gha', home_pmf, away_pmf) / home_lambda.shape[0]
+
+    flat_best = score_probs.reshape(len(home_ix), -1).argmax(axis=1)
+    return {
+        'home_win_prob': p_home + p_tie * home_extra_prob,
+        'away_win_prob': p_away + p_tie * (1 - home_extra_prob),
+        'home_regulation_win_prob': p_home,
+        'away_regulation_win_prob': p_away,
+        'overtime_prob': p_tie * (1 - SHOOTOUT_PROB),
+        'shootout_prob': p_tie * SHOOTOUT_PROB,
+        'expected_home_goals': home_lambda.mean(axis=0),
+        'expected_away_goals': away_lambda.mean(axis=0),
+        'home_goal_probs': home_pmf.mean(axis=1).T,
+        'away_goal_probs': away_pmf.mean(axis=1).T,
+        'score_probs': score_probs,
+        'most_likely_score': [f"{best // (MAX_GOALS + 1)}-{best % (MAX_GOALS + 1)}" for best in flat_best],
+    }
+
+
+class MatchupService:
+    """
+    Game predictions from a saved posterior, with recent matchups cached.
+
+    The posterior store is read once and again only when the file changes, so a new fit
+    is picked up without a restart. Cached matchups are keyed by (posterior version,
+    home, away) and so never outlive the posterior they came from.
+
+    Parameters:
+    path (str): Posterior store written by model_data.get_posterior, defaults to the configured engine's
+    cache_size (int): Matchups kept in memory
+    """
+
+    def __init__(self, path=None, cache_size=CACHE_SIZE):
+        if path is None:
+            #model_data's FACEOFF_ENGINE setting, read here so serving never loads jax
+            path = engine_posterior_path(os.getenv("FACEOFF_ENGINE", "nuts"))
+        self.path = path
+        self.cache_size = cache_size
+        self.samples = None
+        self.version = None
+        self._mtime = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Load the posterior if it hasn't been loaded or the file has changed."""
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"No posterior at {self.path}, run model_data.py or pipeline.py first")
+        mtime = os.path.getmtime(self.path)
+        if mtime != self._mtime:
+            samples, meta = load_posterior(self.path)
+            self.samples, self.version, self._mtime = samples, meta.get("input_hash"), mtime
+
+    def predict_many(self, home_ix, away_ix):
+        """
+        Predictions for several games, computing any that aren't cached in one vectorized pass.
+
+        Returns:
+        list: One dict per game, in the order given
+        """
+        pairs = [(int(home), int(away)) for home, away in zip(home_ix, away_ix)]
+        for home, away in pairs:
+            if home == away:
+                raise ValueError(f"A team can't play itself (team index {home})")
+
+        with self._lock:
+            self.refresh()
+            version = self.version
+            missing = list(dict.fromkeys(pair for pair in pairs if (version, *pair) not in self._cache))
+            if missing:
+                predictions = matchup_predictions(self.samples, [home for home, _ in missing], [away for _, away in missing])
+                for row, (home, away) in enumerate(missing):
+                    self._cache[(version, home, away)] = self._row(predictions, row, home, away)
+            results = []
+            for home, away in pairs:
+                self._cache.move_to_end((version, home, away))
+                results.append(self._cache[(version, home, away)])
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return results
+
+    def predict(self, home_ix, away_ix):
+        """Prediction for a single matchup."""
+        return self.predict_many([home_ix], [away_ix])[0]
+
+    @staticmethod
+    def _row(predictions, row, home, away):
+        result = {
+            'home': teams.set_index('team_index').loc[home, 'team'],
+            'away': teams.set_index('team_index').loc[away, 'team'],
+            'home_ix': home,
+            'away_ix': away,
+        }
+        for key, values in predictions.items():
+            value = values[row]
+            result[key] = value.tolist() if isinstance(value, np.ndarray) else (float(value) if isinstance(value, np.floating) else value)
+        return result
+
+
+def slate_date(schedule_left, date):
+    """The given date if it has games left, otherwise the next date that does, or None."""
+    dates = pd.to_datetime(schedule_left['Date'])
+    upcoming = dates[dates >= pd.Timestamp(date)]
+    return None if upcoming.empty else upcoming.min()
+
+
+def slate_table(samples, schedule_left, date):
+    """
+    Predictions for every game on the next night with games, for the game_predictions table.
+
+    Parameters:
+    samples (dict): Posterior samples
+    schedule_left (DataFrame): Remaining games with 'Date', 'home_ix' and 'away_ix'
+    date (str): Today's date - tonight's games are used, or the next night's if there are none
+
+    Returns:
+    DataFrame: One row per game, goal distributions as lists for the jsonb columns
+    """
+    columns = [
+        'date', 'home', 'away', 'home_win_prob', 'away_win_prob', 'home_regulation_win_prob',
+        'away_regulation_win_prob', 'overtime_prob', 'shootout_prob', 'expected_home_goals',
+        'expected_away_goals', 'most_likely_score', 'home_goal_probs', 'away_goal_probs',
+    ]
+    night = slate_date(schedule_left, date)
+    if night is None:
+        return pd.DataFrame(columns=columns)
+
+    games = schedule_left[pd.to_datetime(schedule_left['Date']) == night]
+    predictions = matchup_predictions(samples, games['home_ix'].values, games['away_ix'].values)
+    names = teams.set_index('team_index')['team']
+
+    slate = pd.DataFrame({
+        'date': night.strftime('%Y-%m-%d'),
+        'home': names.loc[games['home_ix']].values,
+        'away': names.loc[games['away_ix']].values,
+    })
+    for key in columns[3:]:
+        values = predictions[key]
+        if key.endswith('goal_probs'):
+            values = [np.round(row, 4).tolist() for row in values]
+        slate[key] = values
+    return slate[columns]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+    schedule_left = None
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == "/health":
+                self._send(200, {"posterior_version": self.service.version})
+            elif url.path == "/matchup":
+                if "home" not in query or "away" not in query:
+                    raise ValueError("Pass home and away, e.g. /matchup?home=BOS&away=TOR")
+                self._send(200, self.service.predict(team_index(query["home"]), team_index(query["away"])))
+            elif url.path == "/slate":
+                if self.schedule_left is None:
+                    raise ValueError("No schedule loaded, start the server with --schedule")
+                night = slate_date(self.schedule_left, query.get("date", datetime.date.today().isoformat()))
+                games = self.schedule_left.iloc[:0] if night is None else self.schedule_left[pd.to_datetime(self.schedule_left['Date']) == night]
+                self._send(200, self.service.predict_many(games['home_ix'], games['away_ix']))
+            else:
+                self._send(404, {"error": f"Unknown path {url.path}, use /matchup, /slate or /health"})
+        except (ValueError, FileNotFoundError) as err:
+            self._send(400, {"error": str(err)})
+
+
+def serve(service, host="127.0.0.1", port=8000, schedule_left=None):
+    """Answer /matchup, /slate and /health over HTTP until interrupted."""
+    _Handler.service = service
+    _Handler.schedule_left = schedule_left
+    server = ThreadingHTTPServer((host, port), _Handler)
+    print(f"Serving predictions on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def _load_schedule_left():
+    from build_data import build_games
+    from predictions import remaining_schedule
+
+    return remaining_schedule(build_games())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Game predictions from the saved posterior")
+    parser.add_argument("--posterior", default=None, help="posterior store, the configured engine's by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    matchup_parser = commands.add_parser("matchup", help="predict one game")
+    matchup_parser.add_argument("home", help="team index, abbreviation or name")
+    matchup_parser.add_argument("away", help="team index, abbreviation or name")
+
+    slate_parser = commands.add_parser("slate", help="predict tonight's games")
+    slate_parser.add_argument("--date", default=datetime.date.today().isoformat())
+
+    serve_parser = commands.add_parser("serve", help="run a local HTTP server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--schedule", action="store_true", help="load the schedule so /slate works")
+    args = parser.parse_args()
+
+    service = MatchupService(args.posterior)
+    if args.command == "matchup":
+        prediction = service.predict(team_index(args.home), team_index(args.away))
+        prediction.pop('score_probs')
+        print(json.dumps(prediction, indent=2))
+    elif args.command == "slate":
+        service.refresh()
+        print(slate_table(service.samples, _load_schedule_left(), args.date).drop(columns=['home_goal_probs', 'away_goal_probs']).to_string(index=False))
+    else:
+        serve(service, args.host, args.port, _load_schedule_left() if args.schedule else None)
@@ -1,39 +1,81 @@
 #Read in packages
-from build_data import data_hr
+import os
 import pandas as pd
 import datetime as dt
 import numpyro
 import numpyro.distributions as dist
 import jax.numpy as jnp
 from jax import random
-from numpyro.infer import MCMC, NUTS, Predictive
-import arviz as az
+from numpyro.infer import MCMC, NUTS, SVI, Predictive, Trace_ELBO, init_to_value
+from numpyro.infer.autoguide import AutoMultivariateNormal, AutoNormal
+from numpyro import optim
+from jax.scipy.special import gammaln
+import numpy as np
+import json
+from posterior import engine_posterior_path, inputs_hash, load_posterior, save_posterior
+from compile_cache import enable_compilation_cache
+from predictions import outcome_probs
+
+#Number of NUTS chains and how to run them: "parallel" runs one chain per CPU host device,
+#"vectorized" runs all chains on one device. Host devices have to be set before JAX starts.
+num_chains = int(os.getenv("FACEOFF_NUM_CHAINS", "1"))
+chain_method = os.getenv("FACEOFF_CHAIN_METHOD", "parallel")
+if num_chains > 1 and chain_method == "parallel":
+    numpyro.set_host_device_count(min(num_chains, os.cpu_count() or 1))
+
+#Reuse kernels compiled by earlier runs - see compile_cache
+enable_compilation_cache()
 
 
 
 #Set dt_time to today's date
 dt_time = dt.datetime.today().strftime('%Y-%m-%d')
 
-# Filter rows where 'Date' is before dt_time using boolean indexing
-results = data_hr[data_hr['home_score'].notna()].copy()
+#import team names for arviz
+teams = pd.read_csv("formatting/teams.csv")
+
+#Get number of teams - should be 32
+n_teams = len(teams)
+
+
+def prepare_results(data_hr):
+    """
+    Completed games with a 'days_since' column, as we'll need it for decay_rate in the model.
+
+    Parameters:
+    data_hr (DataFrame): Games from build_data.build_games()
+
+    Returns:
+    DataFrame: Games with scores
+    """
+    # Filter rows where 'Date' is before dt_time using boolean indexing
+    results = data_hr[data_hr['home_score'].notna()].copy()
+    results['days_since'] = (results['Date'].max() - results['Date']).dt.days
+    return results
 
-#Create new column 'days_since' as we'll need it for decay_rate in the model
-results['days_since'] = (results['Date'].max() - results['Date']).dt.days
 
-#Get number of unique teams in data - should be 32
-n_teams = data_hr['Home'].nunique()
+def model_inputs(results):
+    """Set up data for input into model: (data_in, y_1, y_2)."""
+    data_in = results[['home_ix','away_ix','days_since']].values
+    y_1 = results['home_score'].values
+    y_2 = results['away_score'].values
+    return data_in, y_1, y_2
 
-#Set intial decay factor 0.005 is a good first guess
+
+#Set intial decay factor 0.005 is a good first guess - backtest.py scores alternatives
 decay_factor = 0.005
 
-#Define the bradley-terry model
-def model(data_in,y_1=None,y_2=None):
-    home = numpyro.sample("home", dist.Normal(1,0.1))
-    intercept = numpyro.sample("intercerpt", dist.Normal(1,0.1))
+#Likelihood used for fitting: "pairs" sums the decay-weighted goals of every game between
+#the same home and away team before fitting, so each gradient is evaluated over at most
+#32 x 31 pairs however many seasons are loaded. "games" evaluates every game separately.
+#Both give the same log density, so the choice isn't part of the posterior hash.
+likelihood = os.getenv("FACEOFF_LIKELIHOOD", "pairs")
 
-    #Decay rate based on time since game - will be able to tweak factor for better performance
-    decay_rate = jnp.exp(-decay_factor*data_in[:,2])
 
+def _ratings():
+    """Priors shared by both likelihoods: home advantage, intercept and zero-sum ratings."""
+    home = numpyro.sample("home", dist.Normal(1,0.1))
+    intercept = numpyro.sample("intercerpt", dist.Normal(1,0.1))
 
     #Attack Ratings
     tau_att = numpyro.sample("tau_att", dist.Gamma(0.1,0.1))
@@ -46,6 +88,15 @@ def model(data_in,y_1=None,y_2=None):
     #Apply zero-sum constraints
     atts = numpyro.deterministic("atts", atts_star - jnp.mean(atts_star))
     defs = numpyro.deterministic("defs", defs_star - jnp.mean(defs_star))
+    return home, intercept, atts, defs
+
+
+#Define the bradley-terry model
+def model(data_in,y_1=None,y_2=None,decay_factor=decay_factor):
+    home, intercept, atts, defs = _ratings()
+
+    #Decay rate based on time since game - will be able to tweak factor for better performance
+    decay_rate = jnp.exp(-decay_factor*data_in[:,2])
 
     #Calculate lambdas
 
@@ -56,34 +107,690 @@ def model(data_in,y_1=None,y_2=None):
         home_goals = numpyro.sample("home_goals", dist.Poisson(home_lambda),obs=y_1)
         away_goals = numpyro.sample("away_goals", dist.Poisson(away_lambda),obs=y_2)
 
-#Set up data for input into model
-data_in = results[['home_ix','away_ix','days_since']].values
-y_1 = results['home_score'].values
-y_2 = results['away_score'].values
 
+def pair_statistics(data_in, y_1, y_2, decay_factor=decay_factor):
+    """
+    Sufficient statistics of the decay-weighted Poisson likelihood per home/away pair.
 
-#Run model for the most updated fixtures e.g. current skill level
-rng_key = random.PRNGKey(0)
-rng_key, rng_key_ = random.split(rng_key)
-num_samples =  2000
-kernel = NUTS(model)
-mcmc = MCMC(kernel, num_warmup=1000, num_samples=num_samples)
-mcmc.run(rng_key,data_in = data_in, y_1=y_1,y_2=y_2)
+    A game's rates only depend on its pair, so its weighted log likelihood
+    w * (y * log(lambda) - lambda - log(y!)) sums over a pair's games to
+    log(lambda) * sum(w * y) - lambda * sum(w) - sum(w * log(y!)).
 
-#import team names for arviz
-teams = pd.read_csv("formatting/teams.csv")
-#Convert object to arviz for easier processing
-baseline_mcmc = az.from_numpyro(mcmc, coords={"atts_star_dim_0": teams['team'], "defs_star_dim_0":teams['team']})
+    Every pairing is included, unplayed ones with zero sums, so the statistics always have
+    the same shape and the compiled fit is reused from one day to the next.
+
+    Parameters:
+    data_in (array): Model input with columns home_ix, away_ix, days_since
+    y_1 (array): Home goals
+    y_2 (array): Away goals
+    decay_factor (float): Decay factor of the game weights
+
+    Returns:
+    dict: n_teams x (n_teams - 1) pairs with home_ix, away_ix, weight, weighted home_goals and away_goals, and the
+        weighted log factorials of the goals
+    """
+    home_ix = np.asarray(data_in[:, 0]).astype(int)
+    away_ix = np.asarray(data_in[:, 1]).astype(int)
+    weights = np.exp(-decay_factor * np.asarray(data_in[:, 2], dtype=float))
+    y_1 = np.asarray(y_1, dtype=float)
+    y_2 = np.asarray(y_2, dtype=float)
+
+    pair_of_game = home_ix * n_teams + away_ix
+    #A team never plays itself, so the diagonal of the n_teams x n_teams grid is left out
+    pairs = np.array([pair for pair in range(n_teams * n_teams) if pair // n_teams != pair % n_teams])
+
+    def pair_sums(values):
+        return np.bincount(pair_of_game, weights=values, minlength=n_teams * n_teams)[pairs]
+
+    return {
+        "home_ix": pairs // n_teams,
+        "away_ix": pairs % n_teams,
+        "weight": pair_sums(weights),
+        "home_goals": pair_sums(weights * y_1),
+        "away_goals": pair_sums(weights * y_2),
+        "log_factorials": pair_sums(weights * (gammaln(y_1 + 1) + gammaln(y_2 + 1))),
+    }
+
+
+def pair_model(pairs):
+    """model() with the games collapsed into the per-pair sums from pair_statistics()."""
+    home, intercept, atts, defs = _ratings()
+
+    log_home = intercept + home + atts[pairs["home_ix"]] + defs[pairs["away_ix"]]
+    log_away = intercept + atts[pairs["away_ix"]] + defs[pairs["home_ix"]]
+    #Goal Expectation - the weighted Poisson log likelihood of every game, summed per pair
+    numpyro.factor(
+        "goals",
+        jnp.sum(pairs["home_goals"] * log_home - pairs["weight"] * jnp.exp(log_home))
+        + jnp.sum(pairs["away_goals"] * log_away - pairs["weight"] * jnp.exp(log_away))
+        - jnp.sum(pairs["log_factorials"]),
+    )
+
+
+def model_and_args(data_in, y_1, y_2, method=None, **model_kwargs):
+    """
+    The model to fit for the configured likelihood and the keyword arguments to run it with.
+
+    Parameters:
+    data_in (array): Model input with columns home_ix, away_ix, days_since
+    y_1 (array): Home goals
+    y_2 (array): Away goals
+    method (str): "pairs" or "games", defaults to the configured likelihood
+    model_kwargs: Passed on to the model, e.g. decay_factor
+
+    Returns:
+    tuple: (model function, keyword arguments)
+    """
+    method = method or likelihood
+    if method == "pairs":
+        return pair_model, {"pairs": pair_statistics(data_in, y_1, y_2, **model_kwargs)}
+    if method == "games":
+        return model, dict(data_in=data_in, y_1=y_1, y_2=y_2, **model_kwargs)
+    raise ValueError(f"Unknown likelihood '{method}', expected 'pairs' or 'games'")
+
+#Inference engine: "nuts" for full MCMC, or the fast SVI approximations "svi" (mean-field
+#normal guide) and "svi_mvn" (full-rank normal guide). A Laplace approximation is not offered
+#as the MAP of this hierarchical model collapses tau_att/tau_def and its Hessian is singular.
+engine = os.getenv("FACEOFF_ENGINE", "nuts")
+svi_steps = 5000
+svi_step_size = 0.01
+
+#An SVI fit counts as converged when its loss over the last 10% of steps varies by less than
+#this fraction of its mean - about 0.005 after 5000 steps on a full season, 0.02 after 1000
+max_loss_tail_spread = 0.01
+
+#Latent sites plus the zero-sum ratings, i.e. everything mcmc.get_samples() returns
+POSTERIOR_SITES = ["home", "intercerpt", "tau_att", "atts_star", "tau_def", "defs_star", "atts", "defs"]
+
+#MCMC settings - part of the posterior hash so changing them forces a refit.
+#num_samples is the total across chains, so adding chains shortens each one. Set
+#FACEOFF_NUM_SAMPLES for bigger runs, e.g. 50000 with FACEOFF_LOW_MEMORY=1 in pipeline.py,
+#which streams the season simulation so memory doesn't grow with the draws. FACEOFF_ADAPTIVE=1
+#needs about 25000 early in the season to reach its targets (see projections.TARGET_POINTS_SE).
+num_warmup = 1000
+num_samples = int(os.getenv("FACEOFF_NUM_SAMPLES", "2000"))
+seed = 0
+
+#Every thin-th draw is kept (FACEOFF_THIN), so num_samples // thin draws come out of a fit
+thin = int(os.getenv("FACEOFF_THIN", "1"))
+
+#Incremental fits start from the last fit's adapted step size, mass matrix and chain state
+#and only run a short warmup. Set FACEOFF_INCREMENTAL=0 to always fit from scratch.
+incremental = os.getenv("FACEOFF_INCREMENTAL", "1") == "1"
+warm_num_warmup = 200
+
+#Limits beyond which a warm start is not trusted and a full refit is run instead
+max_warm_fits = 14
+max_new_games = 150
+min_accept_prob = 0.6
+max_rating_shift_sd = 1.0
+
+#Convergence thresholds for the attack/defense ratings
+max_r_hat = 1.01
+min_ess_bulk = 400
+DIAGNOSTICS_PATH = "data/fit_diagnostics.json"
+
+#Posterior is fitted (or loaded from disk) on first use rather than on import
+_posterior = None
+
+
+def fit_settings():
+    settings = {
+        "engine": engine,
+        "decay_factor": decay_factor,
+        "num_warmup": num_warmup,
+        "num_samples": num_samples,
+        "num_chains": num_chains,
+        "seed": seed,
+    }
+    if engine != "nuts":
+        settings.update(svi_steps=svi_steps, svi_step_size=svi_step_size)
+    if thin != 1:
+        settings.update(thin=thin)
+    return settings
+
+
+def fit_model(data_in, y_1, y_2, warm_state=None, **model_kwargs):
+    """
+    Run NUTS on the model for the most updated fixtures e.g. current skill level.
+
+    Parameters:
+    data_in (array): Model input with columns home_ix, away_ix, days_since
+    y_1 (array): Home goals
+    y_2 (array): Away goals
+    warm_state (dict): Optional state from warm_state_from() to start from. The mass matrix
+        is kept fixed and only the step size is re-adapted over a short warmup.
+    model_kwargs: Passed on to the model, e.g. decay_factor
+
+    Returns:
+    MCMC: The fitted numpyro MCMC object
+    """
+    rng_key = random.PRNGKey(seed)
+    rng_key, rng_key_ = random.split(rng_key)
+    fit_model_fn, model_args = model_and_args(data_in, y_1, y_2, **model_kwargs)
+    if warm_state is None:
+        kernel = NUTS(fit_model_fn)
+        warmup = num_warmup
+    else:
+        inverse_mass_matrix = {
+            tuple(warm_state["mass_sites"]): jnp.array(warm_state["inverse_mass_matrix"])
+        }
+        init_values = {site: jnp.array(value) for site, value in warm_state["init_values"].items()}
+        kernel = NUTS(
+            fit_model_fn,
+            step_size=warm_state["step_size"],
+            inverse_mass_matrix=inverse_mass_matrix,
+            adapt_mass_matrix=False,
+            init_strategy=init_to_value(values=init_values),
+        )
+        warmup = warm_num_warmup
+    #The data are passed to the compiled kernel as arguments rather than baked into it, so the
+    #kernel in the persistent compilation cache is reused while the input shapes stay the same
+    #(with the pair likelihood, once every pairing has been played)
+    mcmc = MCMC(
+        kernel,
+        num_warmup=warmup,
+        num_samples=num_samples // num_chains,
+        num_chains=num_chains,
+        chain_method=chain_method,
+        thinning=thin,
+        jit_model_args=True,
+    )
+    mcmc.run(rng_key, extra_fields=("diverging", "accept_prob"), **model_args)
+    return mcmc
+
+
+def fit_approximate(data_in, y_1, y_2, method=None, **model_kwargs):
+    """
+    Fit the model with SVI instead of NUTS.
+
+    Parameters:
+    data_in (array): Model input with columns home_ix, away_ix, days_since
+    y_1 (array): Home goals
+    y_2 (array): Away goals
+    method (str): "svi" or "svi_mvn", defaults to the configured engine
+    model_kwargs: Passed on to the model, e.g. decay_factor
+
+    Returns:
+    tuple: (samples dict shaped like mcmc.get_samples(), diagnostics dict)
+    """
+    method = method or engine
+    fit_model_fn, model_args = model_and_args(data_in, y_1, y_2, **model_kwargs)
+    if method == "svi":
+        guide = AutoNormal(fit_model_fn)
+    elif method == "svi_mvn":
+        guide = AutoMultivariateNormal(fit_model_fn)
+    else:
+        raise ValueError(f"Unknown approximate engine '{method}', expected 'svi' or 'svi_mvn'")
+
+    rng_key, sample_key, predictive_key = random.split(random.PRNGKey(seed), 3)
+    svi = SVI(fit_model_fn, guide, optim.Adam(svi_step_size), Trace_ELBO())
+    svi_result = svi.run(rng_key, svi_steps, progress_bar=False, **model_args)
+
+    #Draw the latent sites from the approximation, then run them through the model for atts/defs
+    #Draws from the approximation are independent, so thinning just means drawing fewer
+    latent = guide.sample_posterior(sample_key, svi_result.params, sample_shape=(num_samples // thin,))
+    predictive = Predictive(fit_model_fn, posterior_samples=latent, return_sites=["atts", "defs"])
+    ratings = predictive(predictive_key, **model_args)
+    samples = {site: np.asarray(latent[site] if site in latent else ratings[site]) for site in POSTERIOR_SITES}
+
+    losses = np.asarray(svi_result.losses)
+    tail = losses[-max(len(losses) // 10, 1):]
+    #Relative spread of the loss over the last 10% of steps, large values mean it hasn't settled
+    tail_spread = float((tail.max() - tail.min()) / abs(tail.mean()))
+    diagnostics = {
+        "engine": method,
+        "final_loss": float(losses[-1]),
+        "loss_tail_spread": tail_spread,
+        "converged": bool(np.isfinite(tail).all() and tail_spread <= max_loss_tail_spread),
+    }
+    return samples, diagnostics
+
+
+def warm_state_from(mcmc, samples):
+    """
+    Extract the adapted step size, mass matrix and last draw of a fit to warm-start the next one.
+
+    With several chains the step sizes and mass matrices are averaged across chains.
+    """
+    adapt_state = mcmc.last_state.adapt_state
+    (mass_sites, inverse_mass_matrix), = adapt_state.inverse_mass_matrix.items()
+    inverse_mass_matrix = np.asarray(inverse_mass_matrix)
+    return {
+        "step_size": float(np.mean(adapt_state.step_size)),
+        "mass_sites": list(mass_sites),
+        "inverse_mass_matrix": inverse_mass_matrix.reshape(-1, inverse_mass_matrix.shape[-1]).mean(axis=0).tolist(),
+        "init_values": {site: np.asarray(samples[site][-1]).tolist() for site in mass_sites},
+    }
+
+
+def warm_start_blockers(meta, n_games):
+    """
+    Reasons the saved fit can't be used to warm-start a fit on the current results.
+
+    Parameters:
+    meta (dict): Metadata of the saved posterior, or None
+    n_games (int): Number of games in the current results
+
+    Returns:
+    list: Empty if a warm start is fine
+    """
+    if meta is None or "warm_state" not in meta:
+        return ["no saved fit to start from"]
+
+    reasons = []
+    if meta.get("settings") != fit_settings():
+        reasons.append("decay_factor or MCMC settings changed")
+    if meta.get("warm_fits", 0) >= max_warm_fits:
+        reasons.append(f"{meta['warm_fits']} warm fits since the last full refit")
+    new_games = n_games - meta.get("n_games", 0)
+    if new_games < 0:
+        reasons.append("fewer games than the saved fit, results were revised")
+    elif new_games > max_new_games:
+        reasons.append(f"{new_games} new games since the saved fit")
+    return reasons
+
+
+def fit_diagnostics(mcmc, warm_state=None, previous_samples=None):
+    """
+    Summarise a fit and flag whether it should be replaced by a full refit.
+
+    Parameters:
+    mcmc (MCMC): A fitted MCMC object, run with diverging and accept_prob extra fields
+    warm_state (dict): The state the fit was warm-started from, if any
+    previous_samples (dict): Posterior of the fit it was warm-started from, if any
+
+    Returns:
+    dict: Divergences, mean acceptance probability, step size and any refit reasons
+    """
+    extra = mcmc.get_extra_fields()
+    step_size = float(np.mean(mcmc.last_state.adapt_state.step_size))
+    report = {
+        "warm_start": warm_state is not None,
+        "num_chains": num_chains,
+        "divergences": int(np.asarray(extra["diverging"]).sum()),
+        "mean_accept_prob": float(np.asarray(extra["accept_prob"]).mean()),
+        "step_size": step_size,
+    }
+    report.update(convergence_summary(to_arviz(mcmc)))
+
+    reasons = []
+    if report["divergences"] > 0:
+        reasons.append(f"{report['divergences']} divergent transitions")
+    if report["mean_accept_prob"] < min_accept_prob:
+        reasons.append(f"mean acceptance probability {report['mean_accept_prob']:.2f}")
+    if warm_state is not None and previous_samples is not None:
+        #A day of games should barely move the ratings, a big jump means the chain is off
+        samples = mcmc.get_samples()
+        shift = max(
+            float(np.max(
+                np.abs(np.asarray(samples[site]).mean(axis=0) - previous_samples[site].mean(axis=0))
+                / previous_samples[site].std(axis=0)
+            ))
+            for site in ["atts", "defs"]
+        )
+        report["max_rating_shift_sd"] = shift
+        if shift > max_rating_shift_sd:
+            reasons.append(f"ratings moved {shift:.2f} posterior sds from the previous fit")
+
+    report["refit_reasons"] = reasons
+    report["needs_full_refit"] = bool(reasons)
+    return report
+
+
+def to_arviz(mcmc, var_names=("atts_star", "defs_star")):
+    """
+    Convert the rating sites of a fitted MCMC object to arviz for easier processing.
+
+    Only the given sites are converted, rather than az.from_numpyro's every site plus a
+    log-likelihood for every draw and game.
+    """
+    import arviz as az
+
+    samples = mcmc.get_samples(group_by_chain=True)
+    return az.from_dict(
+        posterior={site: np.asarray(samples[site]) for site in var_names},
+        coords={"team": teams['team']},
+        dims={site: ["team"] for site in var_names},
+    )
+
+
+def convergence_summary(baseline_mcmc):
+    """
+    R-hat and effective sample size of the attack/defense ratings.
+
+    R-hat needs at least two chains, with one chain it is reported as None.
+
+    Parameters:
+    baseline_mcmc (InferenceData): Fitted posterior as built by to_arviz()
+
+    Returns:
+    dict: Worst R-hat, smallest bulk/tail ESS and whether the thresholds are met
+    """
+    import arviz as az
+
+    #Unrounded, az.summary's default 2 decimals would let an R-hat of 1.014 pass as 1.01
+    summary = az.summary(baseline_mcmc, var_names=["atts_star", "defs_star"], kind="diagnostics", round_to="none")
+    r_hat = float(summary["r_hat"].max()) if num_chains > 1 else None
+    report = {
+        "max_r_hat": r_hat,
+        "min_ess_bulk": float(summary["ess_bulk"].min()),
+        "min_ess_tail": float(summary["ess_tail"].min()),
+    }
+    report["converged"] = bool(
+        (r_hat is None or r_hat <= max_r_hat) and report["min_ess_bulk"] >= min_ess_bulk
+    )
+    return report
+
+
+def team_ratings(samples, date=dt_time):
+    """
+    Mean attack and defense ratings from the posterior.
+
+    Parameters:
+    samples (dict): Posterior samples containing 'atts_star' and 'defs_star'
+    date (str): Date to stamp the ratings with
+
+    Returns:
+    DataFrame: One row per team
+    """
+    # Calculate mean attack and defense ratings from the posterior
+    att_mean = np.asarray(samples["atts_star"]).reshape(-1, n_teams).mean(axis=0)
+    def_mean = np.asarray(samples["defs_star"]).reshape(-1, n_teams).mean(axis=0)
+
+    return pd.DataFrame({
+        'Team': teams['team'],
+        'Mean Attack Rating': att_mean,
+        'Mean Defense Rating': def_mean,
+        'Date': date
+    })
+
+
+def compact_samples(samples):
+    """Posterior samples as float32 numpy arrays, half the size of float64 and all the model needs."""
+    return {name: np.asarray(value, dtype=np.float32) for name, value in samples.items()}
+
+
+def write_team_ratings(samples, path="data/team_ratings.csv"):
+    """Write mean attack and defense ratings from the posterior to csv."""
+    team_ratings(samples).to_csv(path,index=False)
+
+
+def _fit_nuts(data_in, y_1, y_2, meta, samples, refit):
+    """Run NUTS for get_posterior(), warm-started from the saved fit when possible."""
+    warm_state = None
+    if incremental and not refit:
+        blockers = warm_start_blockers(meta, len(y_1))
+        if blockers:
+            print(f"Full refit: {'; '.join(blockers)}")
+        else:
+            warm_state = meta["warm_state"]
+
+    mcmc = fit_model(data_in, y_1, y_2, warm_state)
+    diagnostics = fit_diagnostics(mcmc, warm_state, samples)
+    if warm_state is not None and diagnostics["needs_full_refit"]:
+        print(f"Warm fit rejected, running a full refit: {'; '.join(diagnostics['refit_reasons'])}")
+        warm_state = None
+        mcmc = fit_model(data_in, y_1, y_2)
+        diagnostics = fit_diagnostics(mcmc)
+
+    samples = compact_samples(mcmc.get_samples())
+    extra_meta = {
+        "warm_fits": meta.get("warm_fits", 0) + 1 if warm_state is not None else 0,
+        "warm_state": warm_state_from(mcmc, samples),
+        "diagnostics": diagnostics,
+    }
+    return samples, extra_meta
+
+
+def report_diagnostics(diagnostics):
+    """Print fit diagnostics, warn if the fit has not converged and save them for monitoring."""
+    print(f"Fit diagnostics: {diagnostics}")
+    if not diagnostics["converged"] and "loss_tail_spread" in diagnostics:
+        print(f"Warning: SVI has not converged (loss tail spread {diagnostics['loss_tail_spread']:.4f}, "
+              f"limit {max_loss_tail_spread})")
+    elif not diagnostics["converged"]:
+        print(f"Warning: ratings have not converged (R-hat {diagnostics.get('max_r_hat')}, ESS {diagnostics.get('min_ess_bulk')})")
+    with open(DIAGNOSTICS_PATH, "w") as file:
+        json.dump(dict(diagnostics, fitted=dt_time), file, indent=2)
+
+
+def posterior_path():
+    """Posterior store for the configured engine, so fast approximate fits never replace the NUTS one."""
+    return engine_posterior_path(engine)
+
+
+def get_posterior(results, refit=False, path=None):
+    """
+    Get posterior samples for the current results, fitting the model only when needed.
+
+    The saved posterior is reused as long as the games, decay_factor and MCMC settings
+    it was fitted on are unchanged. With NUTS, when only new games have arrived the fit
+    is warm-started from the saved one, falling back to a full refit if the warm fit's
+    diagnostics say it can't be trusted.
+
+    Parameters:
+    results (DataFrame): Completed games from prepare_results()
+    refit (bool): Ignore any saved posterior and run a full fit with the configured engine
+    path (str): Location of the posterior store, defaults to posterior_path()
+
+    Returns:
+    dict: Site name -> array of posterior samples
+    """
+    global _posterior
+
+    path = path or posterior_path()
+    data_in, y_1, y_2 = model_inputs(results)
+    input_hash = inputs_hash(data_in, y_1, y_2, **fit_settings())
+
+    if not refit and _posterior is not None and _posterior[1] == input_hash:
+        return _posterior[0]
+
+    samples, meta = (None, None) if refit else load_posterior(path)
+    if samples is None or meta.get("input_hash") != input_hash:
+        if engine == "nuts":
+            samples, extra_meta = _fit_nuts(data_in, y_1, y_2, meta, samples, refit)
+        else:
+            samples, diagnostics = fit_approximate(data_in, y_1, y_2)
+            samples = compact_samples(samples)
+            extra_meta = {"diagnostics": diagnostics}
+        report_diagnostics(extra_meta["diagnostics"])
+
+        save_posterior(
+            samples, input_hash, path,
+            settings=fit_settings(),
+            fitted=dt_time,
+            n_games=len(y_1),
+            **extra_meta,
+        )
+
+    _posterior = (samples, input_hash)
+    return samples
+
+
+def check_warm_start(results):
+    """
+    Compare a warm-started fit with a cold fit on the same results.
+
+    A cold fit on every game before the latest date stands in for yesterday's fit. It is
+    used to warm-start a fit on all results, which is compared with a cold fit on all
+    results.
+
+    Parameters:
+    results (DataFrame): Completed games from prepare_results()
+
+    Returns:
+    dict: Largest difference in mean attack/defense rating, in posterior sds, plus timings
+    """
+    import time
+
+    prev = results[results['Date'] < results['Date'].max()]
+    prev_in = np.column_stack([
+        prev['home_ix'].values,
+        prev['away_ix'].values,
+        (prev['Date'].max() - prev['Date']).dt.days.values,
+    ])
+    prev_mcmc = fit_model(prev_in, prev['home_score'].values, prev['away_score'].values)
+    warm_state = warm_state_from(prev_mcmc, prev_mcmc.get_samples())
+    data_in, y_1, y_2 = model_inputs(results)
+
+    start = time.perf_counter()
+    warm_mcmc = fit_model(data_in, y_1, y_2, warm_state)
+    warm_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cold_mcmc = fit_model(data_in, y_1, y_2)
+    cold_time = time.perf_counter() - start
+
+    report = {"warm_seconds": warm_time, "cold_seconds": cold_time}
+    warm, cold = warm_mcmc.get_samples(), cold_mcmc.get_samples()
+    for site in ["atts", "defs", "home", "intercerpt"]:
+        diff = np.abs(np.asarray(warm[site]).mean(axis=0) - np.asarray(cold[site]).mean(axis=0))
+        report[f"{site}_max_sd_diff"] = float(np.max(diff / np.asarray(cold[site]).std(axis=0)))
+    report["warm_diagnostics"] = fit_diagnostics(warm_mcmc, warm_state)
+    return report
+
+
+def check_likelihood(results, n_points=20, repeat=50):
+    """
+    Check the pair likelihood against the per-game one on the current results.
+
+    Both models' log densities and gradients are evaluated at n_points random parameter
+    values; they should agree to floating point precision. Gradient evaluations, which
+    dominate the cost of NUTS, are timed for each.
+
+    Parameters:
+    results (DataFrame): Completed games from prepare_results()
+    n_points (int): Random parameter values to compare at
+    repeat (int): Gradient evaluations timed per likelihood
+
+    Returns:
+    dict: Largest absolute and relative differences plus seconds per gradient evaluation
+    """
+    import time
+    import jax
+    from numpyro.infer.util import initialize_model
+
+    data_in, y_1, y_2 = model_inputs(results)
+    report = {"n_games": len(data_in), "n_pairs_played": int((pair_statistics(data_in, y_1, y_2)["weight"] > 0).sum())}
+    potentials = {}
+    for method in ["games", "pairs"]:
+        model_fn, model_args = model_and_args(data_in, y_1, y_2, method)
+        model_info = initialize_model(random.PRNGKey(seed), model_fn, model_kwargs=model_args)
+        potentials[method] = jax.jit(jax.value_and_grad(model_info.potential_fn))
+
+    #Random points in the unconstrained space NUTS works in - both models share their latent sites
+    point_keys = random.split(random.PRNGKey(seed + 1), n_points)
+    value_diff = grad_diff = relative_diff = 0.0
+    for key in point_keys:
+        params = {
+            site: 0.3 * random.normal(subkey, jnp.shape(value))
+            for (site, value), subkey in zip(model_info.param_info.z.items(), random.split(key, len(model_info.param_info.z)))
+        }
+        games_value, games_grad = potentials["games"](params)
+        pairs_value, pairs_grad = potentials["pairs"](params)
+        value_diff = max(value_diff, float(abs(games_value - pairs_value)))
+        relative_diff = max(relative_diff, float(abs(games_value - pairs_value) / abs(games_value)))
+        for site in params:
+            grad_diff = max(grad_diff, float(jnp.max(jnp.abs(games_grad[site] - pairs_grad[site]))))
+    report.update(max_log_density_diff=value_diff, max_relative_diff=relative_diff, max_grad_diff=grad_diff)
+
+    for method, potential in potentials.items():
+        jax.block_until_ready(potential(params))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            jax.block_until_ready(potential(params))
+        report[f"{method}_grad_seconds"] = (time.perf_counter() - start) / repeat
+    return report
+
+
+def expected_points_left(samples, schedule):
+    """
+    Posterior mean of the points each team will add over the remaining schedule.
+
+    Works from exact outcome probabilities rather than simulation, so differences between
+    engines aren't hidden by Monte Carlo noise. A tied game is worth 1.5 points on average
+    to each side.
+
+    Parameters:
+    samples (dict): Posterior samples
+    schedule (DataFrame): Remaining games with 'home_ix' and 'away_ix'
+
+    Returns:
+    array: Expected points per team index
+    """
+    home_ix = schedule['home_ix'].values
+    away_ix = schedule['away_ix'].values
+    p_home, p_tie, p_away = outcome_probs(samples, home_ix, away_ix)
+
+    points = np.zeros(n_teams)
+    np.add.at(points, home_ix, 2 * p_home + 1.5 * p_tie)
+    np.add.at(points, away_ix, 2 * p_away + 1.5 * p_tie)
+    return points
+
+
+def compare_engines(data_hr, methods=("svi", "svi_mvn"), path="data/engine_report.json"):
+    """
+    Benchmark the approximate engines against NUTS on the current results.
+
+    Reports fit time and how far mean attack/defense ratings, their posterior sds and
+    expected points over the remaining schedule are from the NUTS fit.
+
+    Parameters:
+    data_hr (DataFrame): Games from build_data.build_games()
+    methods (tuple): Approximate engines to compare
+    path (str): Where to write the JSON report
+
+    Returns:
+    dict: The report
+    """
+    import time
+
+    schedule = data_hr[data_hr['home_score'].isna()]
+    data_in, y_1, y_2 = model_inputs(prepare_results(data_hr))
+
+    start = time.perf_counter()
+    nuts_samples = fit_model(data_in, y_1, y_2).get_samples()
+    report = {"nuts": {"seconds": time.perf_counter() - start}}
+    nuts_points = expected_points_left(nuts_samples, schedule)
+
+    for method in methods:
+        start = time.perf_counter()
+        samples, diagnostics = fit_approximate(data_in, y_1, y_2, method)
+        method_report = {"seconds": time.perf_counter() - start, "final_loss": diagnostics["final_loss"]}
+        for site in ["atts_star", "defs_star"]:
+            nuts_site = np.asarray(nuts_samples[site])
+            mean_diff = np.abs(samples[site].mean(axis=0) - nuts_site.mean(axis=0))
+            method_report[f"{site}_max_mean_diff"] = float(mean_diff.max())
+            method_report[f"{site}_mean_sd_ratio"] = float((samples[site].std(axis=0) / nuts_site.std(axis=0)).mean())
+        points_diff = np.abs(expected_points_left(samples, schedule) - nuts_points)
+        method_report["points_left_max_diff"] = float(points_diff.max())
+        method_report["points_left_mean_diff"] = float(points_diff.mean())
+        report[method] = method_report
+
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
 
-# Calculate mean attack and defense ratings from the posterior
-att_mean = baseline_mcmc.posterior["atts_star"].values.reshape(-1, 32).mean(axis=0)
-def_mean = baseline_mcmc.posterior["defs_star"].values.reshape(-1, 32).mean(axis=0)
+    parser = argparse.ArgumentParser(description="Fit the team ratings model")
+    parser.add_argument("--refit", action="store_true", help="ignore the saved posterior and fit from scratch")
+    parser.add_argument("--check-warm-start", action="store_true", help="compare a warm-started fit against a cold fit")
+    parser.add_argument("--compare-engines", action="store_true", help="benchmark the svi engines against NUTS")
+    parser.add_argument("--check-likelihood", action="store_true", help="check the pair likelihood matches the per-game one")
+    args = parser.parse_args()
 
-team_ratings_df = pd.DataFrame({
-    'Team': teams['team'],
-    'Mean Attack Rating': att_mean,
-    'Mean Defense Rating': def_mean,
-    'Date': dt_time
-})
+    from build_data import build_games
 
-team_ratings_df.to_csv("data/team_ratings.csv",index=False)
\ No newline at end of file
+    data_hr = build_games()
+    if args.check_warm_start:
+        print(check_warm_start(prepare_results(data_hr)))
+    elif args.compare_engines:
+        print(json.dumps(compare_engines(data_hr), indent=2))
+    elif args.check_likelihood:
+        print(json.dumps(check_likelihood(prepare_results(data_hr)), indent=2))
+    else:
+        write_team_ratings(get_posterior(prepare_results(data_hr), refit=args.refit))
@@ -0,0 +1,492 @@
+#Read in packages
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    #Not available on Windows, peak memory is then left out of the run report
+    resource = None
+
+#Stage outputs are cached here, one pickle per stage keyed by the hash of its inputs
+PIPELINE_CACHE = "data/pipeline"
+
+#Timings and peak memory of the last run, to spot stages getting slower
+RUN_REPORT_PATH = "data/run_report.json"
+
+#FACEOFF_LOW_MEMORY=1 simulates the season straight from the posterior a chunk of games at
+#a time instead of holding every simulated goal, for big draw counts (FACEOFF_NUM_SAMPLES)
+LOW_MEMORY = os.getenv("FACEOFF_LOW_MEMORY") == "1"
+
+#FACEOFF_ADAPTIVE=1 simulates as many seasons as it takes to reach the precision targets in
+#projections.py rather than one per posterior draw
+ADAPTIVE = os.getenv("FACEOFF_ADAPTIVE") == "1"
+
+#Libraries that are slow to import. Modules only import them inside the stages that need
+#them; the run report notes which stage first loaded each and --startup times the imports.
+HEAVY_MODULES = ["jax", "numpyro", "arviz", "scipy"]
+
+#Entry points timed by --startup
+STARTUP_MODULES = ["pipeline", "update_db", "standings", "projections", "playoffs", "predictions", "model_data"]
+
+#Bump when a stage's code changes in a way that changes its output, to drop every cached result
+PIPELINE_VERSION = 3
+
+
+class Stage:
+    """
+    One step of the daily run.
+
+    Parameters:
+    func: Function computing the stage output, called with its inputs in order
+    inputs (list): Names of the stages (or run parameters) whose outputs func takes
+    cached (bool): Whether the output can be reused while the inputs are unchanged. Stages
+        with side effects or their own cache are always run.
+    summary: Optional function of the output followed by the inputs, returning a dict that
+        is added to the stage's entry in the run report
+    """
+
+    def __init__(self, func, inputs=(), cached=True, summary=None):
+        self.func = func
+        self.inputs = list(inputs)
+        self.cached = cached
+        self.summary = summary
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far in MB, or None where it can't be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Reported in bytes on macOS and in kilobytes on Linux
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def content_hash(value):
+    """Hash of a stage output or input that only changes when its content does."""
+    digest = hashlib.sha256()
+
+    def update(value):
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+            #pandas can't hash list or dict cells (e.g. the slate's goal distributions), so
+            #those are hashed as their JSON
+            nested = {
+                col: value[col].map(lambda cell: json.dumps(cell) if isinstance(cell, (list, dict)) else cell)
+                for col in value.columns[value.dtypes == object]
+                if value[col].map(lambda cell: isinstance(cell, (list, dict))).any()
+            }
+            digest.update(pd.util.hash_pandas_object(value.assign(**nested), index=True).values.tobytes())
+        elif isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            digest.update(f"{value.dtype}{value.shape}".encode())
+            digest.update(value.tobytes())
+        elif isinstance(value, dict):
+            for key in sorted(value):
+                digest.update(repr(key).encode())
+                update(value[key])
+        elif isinstance(value, (list, tuple)):
+            digest.update(f"{type(value).__name__}{len(value)}".encode())
+            for item in value:
+                update(item)
+        else:
+            digest.update(repr(value).encode())
+
+    update(value)
+    return digest.hexdigest()
+
+
+#Stage functions - heavy modules are imported inside them so listing or running one
+#stage only loads what that stage needs
+
+def fetch():
+    """Every game for the configured seasons, scraping only seasons still in progress."""
+    from build_data import build_games
+
+    return build_games()
+
+
+def fit(games):
+    """Posterior samples, reused from the posterior store when the results are unchanged."""
+    from model_data import get_posterior, prepare_results
+
+    return get_posterior(prepare_results(games))
+
+
+def predict(games, samples):
+    """Simulated home and away goals for every remaining game, each (n_games, n_draws)."""
+    from predictions import remaining_schedule, sim_schedule_left
+
+    home_goals, away_goals = sim_schedule_left(remaining_schedule(games), samples)
+    return np.asarray(home_goals), np.asarray(away_goals)
+
+
+def simulate(games, goals):
+    """Final points and remaining regulation wins per team and draw."""
+    from model_data import prepare_results
+    from predictions import remaining_schedule
+    from projections import project_points, teams
+
+    home_goals, away_goals = goals
+    return project_points(remaining_schedule(games), home_goals, away_goals, prepare_results(games), teams)
+
+
+def simulate_streaming(games, samples):
+    """simulate() for the memory-bounded mode, never holding the full goals arrays."""
+    from model_data import prepare_results
+    from predictions import remaining_schedule
+    from projections import project_points_streaming, teams
+
+    return project_points_streaming(remaining_schedule(games), samples, prepare_results(games), teams)
+
+
+def simulate_adaptive(games, samples):
+    """simulate() with as many seasons as the precision targets need, resampling the posterior."""
+    from model_data import prepare_results
+    from predictions import remaining_schedule
+    from projections import project_points_adaptive, teams
+
+    points, regulation_wins_left, _ = project_points_adaptive(
+        remaining_schedule(games), samples, prepare_results(games), teams
+    )
+    return points, regulation_wins_left
+
+
+def simulation_precision(seasons, games, *_):
+    """Draws simulated and the largest Monte Carlo standard errors, for the run report."""
+    from model_data import prepare_results
+    from projections import precision_summary, teams
+
+    points, regulation_wins_left = seasons
+    return precision_summary(points, regulation_wins_left, prepare_results(games), teams)
+
+
+def adaptive_precision(seasons, games, samples):
+    """simulation_precision() for simulate_adaptive(), whose seasons reuse posterior draws."""
+    from model_data import prepare_results
+    from projections import posterior_draw_index, precision_summary, teams
+
+    points, regulation_wins_left = seasons
+    n_posterior = np.asarray(samples["atts"]).reshape(-1, len(teams)).shape[0]
+    draws = posterior_draw_index(points.shape[1], n_posterior)
+    return precision_summary(points, regulation_wins_left, prepare_results(games), teams, draws=draws,
+                             n_posterior=n_posterior)
+
+
+def standings(games):
+    """Cumulative standings on every date of the latest season."""
+    import update_db
+
+    teams = pd.read_csv("formatting/teams.csv")
+    return update_db.create_team_stats_table(games, teams)
+
+
+def ratings(samples, date):
+    """Mean attack and defense rating per team."""
+    from model_data import team_ratings
+
+    return team_ratings(samples, date)
+
+
+def projections(seasons, date):
+    """Encoded point projections for team_points."""
+    from projections import point_projections, teams
+
+    points, _ = seasons
+    return point_projections(points, teams, date)
+
+
+def playoffs(games, seasons, team_stats, date):
+    """Playoff odds, point bands and clinch flags per team."""
+    import update_db
+    from playoffs import season_playoff_table
+    from predictions import remaining_schedule
+
+    teams = pd.read_csv("formatting/teams.csv")
+    points, regulation_wins_left = seasons
+    latest = update_db.get_latest_standings(team_stats)
+    return season_playoff_table(points, regulation_wins_left, latest, remaining_schedule(games), teams, date)
+
+
+def history(samples, date):
+    """Add today's rating summaries to the ratings history and return any not yet pushed upstream."""
+    from ratings_history import append_history, summarise_ratings, unpushed_history
+
+    teams = pd.read_csv("formatting/teams.csv")
+    append_history(summarise_ratings(samples, teams, date))
+    return unpushed_history()
+
+
+def slate(games, samples, date):
+    """Win, overtime and score probabilities for the next night's games."""
+    from matchups import slate_table
+    from predictions import remaining_schedule
+
+    return slate_table(samples, remaining_schedule(games), date)
+
+
+def frontend_snapshot(team_stats, seasons, team_strengths, playoff_odds, date):
+    """Everything the frontend pages show, as one JSON-ready dict."""
+    from snapshot import build_snapshot
+
+    teams = pd.read_csv("formatting/teams.csv")
+    return build_snapshot(team_stats, seasons, team_strengths, playoff_odds, teams, date)
+
+
+def upload(team_stats, seasons, team_strengths, team_points, playoff_odds, game_predictions, rating_history,
+           snapshot):
+    """Write the outputs to data/ for reference and upsert them."""
+    import update_db
+
+    return update_db.publish(
+        team_stats, seasons, team_strengths, team_points, playoff_odds, game_predictions, rating_history, snapshot
+    )
+
+
+STAGES = {
+    "fetch": Stage(fetch, cached=False),
+    "fit": Stage(fit, ["fetch"], cached=False),
+    "predict": Stage(predict, ["fetch", "fit"]),
+    "simulate": (
+        Stage(simulate_adaptive, ["fetch", "fit"], summary=adaptive_precision) if ADAPTIVE
+        else Stage(simulate_streaming, ["fetch", "fit"], summary=simulation_precision) if LOW_MEMORY
+        else Stage(simulate, ["fetch", "predict"], summary=simulation_precision)
+    ),
+    "standings": Stage(standings, ["fetch"]),
+    "ratings": Stage(ratings, ["fit", "date"]),
+    "projections": Stage(projections, ["simulate", "date"]),
+    "playoffs": Stage(playoffs, ["fetch", "simulate", "standings", "date"]),
+    "slate": Stage(slate, ["fetch", "fit", "date"]),
+    "history": Stage(history, ["fit", "date"], cached=False),
+    "snapshot": Stage(frontend_snapshot, ["standings", "simulate", "ratings", "playoffs", "date"]),
+    "upload": Stage(
+        upload,
+        ["standings", "simulate", "ratings", "projections", "playoffs", "slate", "history", "snapshot"],
+        cached=False,
+    ),
+}
+
+
+def required_stages(targets, stages=STAGES):
+    """The target stages plus everything they depend on."""
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name in needed or name not in stages:
+            continue
+        needed.add(name)
+        todo.extend(stages[name].inputs)
+    return needed
+
+
+def _cache_path(cache_dir, name):
+    return os.path.join(cache_dir, f"{name}.pkl")
+
+
+def _load_cached(cache_dir, name, key):
+    path = _cache_path(cache_dir, name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as file:
+            entry = pickle.load(file)
+    except Exception as err:
+        print(f"Ignoring unreadable cache for {name}: {err}")
+        return None
+    return entry if entry.get("key") == key else None
+
+
+def _save_cached(cache_dir, name, key, value, value_hash):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = _cache_path(cache_dir, name)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        pickle.dump({"key": key, "value": value, "hash": value_hash}, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def write_run_report(report, path=RUN_REPORT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+
+
+def run_pipeline(targets=("upload",), force=(), date=None, cache_dir=PIPELINE_CACHE, workers=4, stages=STAGES,
+                 report_path=RUN_REPORT_PATH):
+    """
+    Run the stages needed for the targets, in dependency order and in one process.
+
+    Outputs are passed between stages in memory. A cached stage is skipped when the hashes
+    of its inputs match its last run, and stages whose inputs are ready run concurrently,
+    so e.g. the standings are built while the model is fitted.
+
+    Each stage's wall time, whether it came from the cache, the process's peak memory when
+    it finished and any HEAVY_MODULES it loaded are written to a JSON run report, also when
+    a stage fails, along with the CPU time the process spent starting up and any stage
+    summary, such as the draws and Monte Carlo error of the simulation. Stages running at
+    the same time share the process, so the peak and the imports are not strictly per stage.
+
+    Parameters:
+    targets (iterable): Stages to run, along with everything they depend on
+    force (iterable): Stages to rerun even if their cached output is current
+    date (str): Date to stamp outputs with, today by default
+    cache_dir (str): Where cached stage outputs are kept
+    workers (int): Maximum number of stages run at once
+    stages (dict): Stage name -> Stage
+    report_path (str): Where to write the run report, None to skip it
+
+    Returns:
+    dict: Stage name -> output for every stage that ran or was loaded from cache
+    """
+    date = date or datetime.date.today().strftime('%Y-%m-%d')
+    force = set(force)
+    needed = required_stages(targets, stages)
+
+    outputs = {"date": date}
+    hashes = {"date": content_hash(date)}
+    run_start = time.perf_counter()
+    report = {
+        "date": date,
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "targets": list(targets),
+        "status": "running",
+        #CPU time used before the first stage, i.e. interpreter start up and imports
+        "startup_cpu_seconds": time.process_time(),
+        "stages": {},
+    }
+    loaded = {module for module in HEAVY_MODULES if module in sys.modules}
+
+    def run_stage(name):
+        stage = stages[name]
+        args = [outputs[dep] for dep in stage.inputs]
+        #The function is part of the key as some stages have a different one per mode
+        key = content_hash([PIPELINE_VERSION, name, stage.func.__name__, [hashes[dep] for dep in stage.inputs]])
+
+        start = time.perf_counter()
+        report["stages"][name] = {"started_seconds": start - run_start}
+        if stage.cached and name not in force:
+            entry = _load_cached(cache_dir, name, key)
+            if entry is not None:
+                return entry["value"], entry["hash"], time.perf_counter() - start, True
+
+        value = stage.func(*args)
+        value_hash = content_hash(value)
+        if stage.cached:
+            _save_cached(cache_dir, name, key, value, value_hash)
+        return value, value_hash, time.perf_counter() - start, False
+
+    pending = set(needed)
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while pending or running:
+                ready = [name for name in pending if all(dep in outputs for dep in stages[name].inputs)]
+                for name in sorted(ready):
+                    pending.discard(name)
+                    running[pool.submit(run_stage, name)] = name
+                if not running:
+                    raise ValueError(f"Stages {sorted(pending)} have inputs no stage provides")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        value, value_hash, seconds, from_cache = future.result()
+                    except Exception:
+                        report["stages"][name]["failed"] = True
+                        raise
+                    outputs[name], hashes[name] = value, value_hash
+                    imported = [module for module in HEAVY_MODULES if module in sys.modules and module not in loaded]
+                    loaded.update(imported)
+                    report["stages"][name].update(
+                        seconds=seconds, cached=from_cache, peak_rss_mb=peak_rss_mb(), imported=imported
+                    )
+                    if stages[name].summary is not None:
+                        summary = stages[name].summary(value, *[outputs[dep] for dep in stages[name].inputs])
+                        report["stages"][name].update(summary)
+                    print(f"{name}: {'cached' if from_cache else 'ran'} in {seconds:.1f}s")
+        report["status"] = "ok"
+    except Exception:
+        report["status"] = "failed"
+        raise
+    finally:
+        report["total_seconds"] = time.perf_counter() - run_start
+        report["peak_rss_mb"] = peak_rss_mb()
+        if report_path:
+            write_run_report(report, report_path)
+        peak = report["peak_rss_mb"]
+        print(f"Run took {report['total_seconds']:.1f}s, peak memory {'unknown' if peak is None else f'{peak:.0f} MB'}")
+
+    return outputs
+
+
+def startup_report(modules=STARTUP_MODULES):
+    """
+    Time importing each module in a fresh interpreter, as a new process would.
+
+    Parameters:
+    modules (list): Modules to import, one interpreter each
+
+    Returns:
+    dict: Module -> import_seconds and the HEAVY_MODULES it loaded
+    """
+    import subprocess
+
+    code = (
+        "import sys, time; start = time.perf_counter(); import {module}; "
+        "print(time.perf_counter() - start); print(' '.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    report = {}
+    for module in modules:
+        result = subprocess.run(
+            [sys.executable, "-c", code.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True,
+        )
+        seconds, heavy = result.stdout.splitlines()[-2:]
+        report[module] = {"import_seconds": float(seconds), "heavy_imports": heavy.split()}
+    return report
+
+
+def _describe(value):
+    """Short printable summary of a stage output for the CLI."""
+    if isinstance(value, pd.DataFrame):
+        return value.head(10).to_string()
+    if isinstance(value, np.ndarray):
+        return f"array {value.shape} {value.dtype}"
+    if isinstance(value, dict):
+        return "\n".join(f"{key}: {_describe(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_describe(item) for item in value)
+    return repr(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the daily pipeline, or part of it")
+    parser.add_argument("--stage", nargs="+", default=["upload"], choices=list(STAGES),
+                        help="stages to run, along with their dependencies")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES),
+                        help="stages to rerun even if cached")
+    parser.add_argument("--date", default=None, help="date to stamp outputs with (YYYY-MM-DD)")
+    parser.add_argument("--list", action="store_true", help="list the stages and their inputs")
+    parser.add_argument("--startup", action="store_true", help="time importing each entry point in a fresh interpreter")
+    args = parser.parse_args()
+
+    if args.startup:
+        print(json.dumps(startup_report(), indent=2))
+    elif args.list:
+        for name, stage in STAGES.items():
+            print(f"{name} <- {', '.join(stage.inputs) or '-'}{'' if stage.cached else ' (not cached)'}")
+    else:
+        outputs = run_pipeline(args.stage, args.force, args.date)
+        for name in args.stage:
+            print(f"\n== {name} ==\n{_describe(outputs[name])}")
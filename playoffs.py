@@ -0,0 +1,218 @@
+#Read in packages
+import numpy as np
+import pandas as pd
+
+#Playoff format: top 3 in each division plus 2 wildcards per conference
+DIVISION_SPOTS = 3
+WILDCARD_SPOTS = 2
+
+#Percentile bands of final points reported per team
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def ranking_keys(points, regulation_wins, seed=0):
+    """
+    Sort keys for every team and draw: points, then regulation wins, then a coin flip.
+
+    Parameters:
+    points (array): Final points with shape (n_teams, n_draws)
+    regulation_wins (array): Final regulation wins with the same shape
+    seed (int): Seed for the generator used to break any remaining ties
+
+    Returns:
+    array: Keys where higher is better
+    """
+    rng = np.random.default_rng(seed)
+    #Regulation wins never exceed 82, so they can't outweigh a point
+    return points * 1000 + regulation_wins + 0.5 * rng.uniform(size=points.shape)
+
+
+def _order(keys):
+    """Row indexes of keys sorted best first, per draw (column)."""
+    return np.argsort(-keys, axis=0)
+
+
+def _ranks(keys):
+    """Rank of each row per draw, 0 being best."""
+    return np.argsort(_order(keys), axis=0)
+
+
+def simulate_spots(points, keys, teams):
+    """
+    Work out division, wildcard and Presidents' Trophy finishes for every draw at once.
+
+    Parameters:
+    points (array): Final points with shape (n_teams, n_draws)
+    keys (array): Sort keys from ranking_keys()
+    teams (DataFrame): Teams with 'team_index', 'division' and 'conference', ordered by team_index
+
+    Returns:
+    dict: Boolean arrays (n_teams, n_draws) for each finish, plus the points needed for
+          the last division spot and the last wildcard in each draw, per team's group
+    """
+    n_teams, n_draws = points.shape
+    draws = np.arange(n_draws)
+    spots = {
+        "division_winner": np.zeros((n_teams, n_draws), dtype=bool),
+        "division_top3": np.zeros((n_teams, n_draws), dtype=bool),
+        "wildcard": np.zeros((n_teams, n_draws), dtype=bool),
+        "division_threshold": np.full((n_teams, n_draws), np.nan),
+        "wildcard_threshold": np.full((n_teams, n_draws), np.nan),
+    }
+
+    for division in teams['division'].unique():
+        mask = (teams['division'] == division).values
+        ranks = _ranks(keys[mask])
+        spots["division_winner"][mask] = ranks == 0
+        spots["division_top3"][mask] = ranks < DIVISION_SPOTS
+        if mask.sum() > DIVISION_SPOTS:
+            #Points of the first team out, i.e. what it takes to finish top 3
+            first_out = _order(keys[mask])[DIVISION_SPOTS]
+            spots["division_threshold"][mask] = points[mask][first_out, draws]
+
+    for conference in teams['conference'].unique():
+        mask = (teams['conference'] == conference).values
+        #Division qualifiers drop out of the wildcard race
+        contender_keys = np.where(spots["division_top3"][mask], -np.inf, keys[mask])
+        ranks = _ranks(contender_keys)
+        spots["wildcard"][mask] = ~spots["division_top3"][mask] & (ranks < WILDCARD_SPOTS)
+        last_wildcard = _order(contender_keys)[WILDCARD_SPOTS - 1]
+        spots["wildcard_threshold"][mask] = points[mask][last_wildcard, draws]
+
+    spots["presidents_trophy"] = keys == keys.max(axis=0)
+    return spots
+
+
+def _qualifies(own_above, other_above):
+    """
+    Whether a team makes the playoffs given how many conference teams finish above it.
+
+    own_above counts teams above it in its own division, other_above those in the other
+    division of its conference. Anyone above it in the other division includes that
+    division's top 3 once there are at least 3 of them.
+    """
+    if own_above < DIVISION_SPOTS:
+        return True
+    wildcards_above = (own_above - DIVISION_SPOTS) + max(0, other_above - DIVISION_SPOTS)
+    return wildcards_above < WILDCARD_SPOTS
+
+
+def clinch_status(current_points, games_left, teams):
+    """
+    Mathematical clinch and elimination flags from the current standings.
+
+    A team has clinched if it still qualifies when every conference rival that can reach
+    its current points does so. It is eliminated if it misses out even when it wins every
+    remaining game and only the rivals already out of reach finish above it.
+
+    Parameters:
+    current_points (array): Points per team index
+    games_left (array): Remaining games per team index
+    teams (DataFrame): Teams with 'division' and 'conference', ordered by team_index
+
+    Returns:
+    DataFrame: clinched_division_spot, clinched_playoffs and eliminated per team index
+    """
+    max_points = current_points + 2 * games_left
+    division = teams['division'].values
+    conference = teams['conference'].values
+
+    rows = []
+    for ix in range(len(teams)):
+        rivals = (conference == conference[ix]) & (np.arange(len(teams)) != ix)
+        own = division == division[ix]
+
+        can_catch = rivals & (max_points >= current_points[ix])
+        own_worst, other_worst = (can_catch & own).sum(), (can_catch & ~own).sum()
+
+        out_of_reach = rivals & (current_points > max_points[ix])
+        own_best, other_best = (out_of_reach & own).sum(), (out_of_reach & ~own).sum()
+
+        rows.append({
+            'clinched_division_spot': bool(own_worst < DIVISION_SPOTS),
+            'clinched_playoffs': _qualifies(own_worst, other_worst),
+            'eliminated': not _qualifies(own_best, other_best),
+        })
+    return pd.DataFrame(rows)
+
+
+def playoff_odds(points, regulation_wins, teams, current_points, games_left, date, seed=0):
+    """
+    Summarise simulated seasons into playoff probabilities and point bands per team.
+
+    Parameters:
+    points (array): Final points per team index and draw, shape (n_teams, n_draws)
+    regulation_wins (array): Final regulation wins, same shape as points
+    teams (DataFrame): Team information including 'division' and 'conference'
+    current_points (array): Points per team index in the standings today
+    games_left (array): Remaining games per team index
+    date (str): Date to stamp the table with
+    seed (int): Seed for random tiebreaks
+
+    Returns:
+    DataFrame: One row per team
+    """
+    teams = teams.sort_values('team_index').reset_index(drop=True)
+    keys = ranking_keys(points, regulation_wins, seed)
+    spots = simulate_spots(points, keys, teams)
+
+    odds = pd.DataFrame({
+        'team': teams['team'],
+        'date': date,
+        'mean_points': points.mean(axis=1),
+    })
+    bands = np.percentile(points, PERCENTILES, axis=1)
+    for pct, band in zip(PERCENTILES, bands):
+        odds[f'points_p{pct:02d}'] = band
+
+    odds['division_winner_prob'] = spots['division_winner'].mean(axis=1)
+    odds['division_top3_prob'] = spots['division_top3'].mean(axis=1)
+    odds['wildcard_prob'] = spots['wildcard'].mean(axis=1)
+    odds['playoff_prob'] = (spots['division_top3'] | spots['wildcard']).mean(axis=1)
+    odds['presidents_trophy_prob'] = spots['presidents_trophy'].mean(axis=1)
+    odds['division_threshold'] = np.nanmean(spots['division_threshold'], axis=1)
+    odds['wildcard_threshold'] = np.nanmean(spots['wildcard_threshold'], axis=1)
+
+    status = clinch_status(np.asarray(current_points), np.asarray(games_left), teams)
+    return pd.concat([odds, status], axis=1)
+
+
+def season_playoff_table(points, regulation_wins_left, standings, schedule_left, teams, date, seed=0):
+    """
+    Build the playoff odds table from simulated seasons.
+
+    Parameters:
+    points (array): Final points per team index and draw, shape (n_teams, n_draws)
+    regulation_wins_left (array): Regulation wins over the remaining games, same shape
+    standings (DataFrame): Latest standings from update_db.create_team_stats_table
+    schedule_left (DataFrame): Remaining games with 'home_ix' and 'away_ix'
+    teams (DataFrame): Team information
+    date (str): Date to stamp the table with
+    seed (int): Seed for random tiebreaks
+
+    Returns:
+    DataFrame: One row per team
+    """
+    if regulation_wins_left.shape != points.shape:
+        #No games left to simulate
+        regulation_wins_left = np.zeros_like(points)
+
+    n_teams = len(teams)
+    standings = standings.set_index('team_index').reindex(range(n_teams))
+    current_points = standings['points'].fillna(0).values
+    current_regulation_wins = standings['regulation_wins'].fillna(0).values
+
+    games_left = (
+        np.bincount(schedule_left['home_ix'], minlength=n_teams)
+        + np.bincount(schedule_left['away_ix'], minlength=n_teams)
+    )
+
+    return playoff_odds(
+        points,
+        current_regulation_wins[:, None] + regulation_wins_left,
+        teams,
+        current_points,
+        games_left,
+        date,
+        seed,
+    )
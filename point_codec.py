@@ -0,0 +1,54 @@
+#Read in packages
+import base64
+import numpy as np
+
+#Compact encoding for the simulated season point totals stored in team_points and the
+#scenario odds. Each value is "<format>:<base64 payload>", little-endian throughout:
+#  hist - uint32 lowest points total followed by uint32 counts for every total from there up
+#  i16  - int16 samples in draw order, only found in older rows
+#Season totals are whole numbers, so both are exact. frontend/src/pointCodec.js mirrors this.
+
+
+def _b64(array):
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def _integral(points):
+    points = np.asarray(points, dtype=float)
+    values = np.rint(points)
+    if not np.allclose(points, values):
+        raise ValueError("Point samples must be whole numbers to be encoded")
+    return values.astype(np.int64)
+
+
+def encode_histogram(points):
+    """Encode point samples as counts per points total."""
+    values = _integral(points)
+    if values.size == 0:
+        return "hist:"
+    low = values.min()
+    counts = np.bincount(values - low)
+    return "hist:" + _b64(np.concatenate([[low], counts]).astype("<u4"))
+
+
+def decode_points(value):
+    """
+    Decode a stored points value back to an array of samples.
+
+    Also reads the original "[84.0,77.0,...]" strings. Histograms come back sorted, as
+    the draw order isn't stored.
+    """
+    if value.startswith("["):
+        return np.array([float(v) for v in value.strip("[]").split(",") if v.strip()])
+
+    fmt, _, payload = value.partition(":")
+    raw = base64.b64decode(payload)
+    if fmt == "i16":
+        return np.frombuffer(raw, dtype="<i2").astype(float)
+    if fmt == "hist":
+        if not raw:
+            return np.array([])
+        header = np.frombuffer(raw, dtype="<u4")
+        low, counts = int(header[0]), header[1:]
+        return np.repeat(np.arange(low, low + len(counts)), counts).astype(float)
+    raise ValueError(f"Unknown points encoding '{fmt}'")
@@ -0,0 +1,80 @@
+#Read in packages
+import hashlib
+import json
+import os
+import numpy as np
+
+#Default location of the saved posterior
+POSTERIOR_PATH = "data/posterior.npz"
+
+
+def engine_posterior_path(engine, path=POSTERIOR_PATH):
+    """Posterior store for an inference engine, so fast approximate fits never replace the NUTS one."""
+    if engine == "nuts":
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{engine}{ext}"
+
+
+def inputs_hash(data_in, y_1, y_2, **settings):
+    """
+    Hash the games fed to the model together with the settings of the fit.
+
+    Parameters:
+    data_in (array): Model input with columns home_ix, away_ix, days_since
+    y_1 (array): Home goals
+    y_2 (array): Away goals
+    settings: Any other values the posterior depends on e.g. decay_factor, num_samples
+
+    Returns:
+    str: Hex digest identifying this fit
+    """
+    h = hashlib.sha256()
+    for arr in (data_in, y_1, y_2):
+        arr = np.ascontiguousarray(np.asarray(arr, dtype=np.float64))
+        h.update(str(arr.shape).encode())
+        h.update(arr.tobytes())
+    h.update(json.dumps(settings, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def save_posterior(samples, input_hash, path=POSTERIOR_PATH, **metadata):
+    """
+    Save posterior samples to a compressed .npz file.
+
+    Parameters:
+    samples (dict): Site name -> array of samples, e.g. from mcmc.get_samples()
+    input_hash (str): Hash of the inputs the posterior was fitted on
+    path (str): Where to write the file
+    metadata: Extra JSON-serialisable values stored alongside the samples
+    """
+    arrays = {f"sample__{name}": np.asarray(value) for name, value in samples.items()}
+    meta = dict(metadata, input_hash=input_hash)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    #Write to a temporary file first so a failed run never leaves a half-written posterior
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, __meta__=np.array(json.dumps(meta)), **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_posterior(path=POSTERIOR_PATH):
+    """
+    Load posterior samples saved with save_posterior.
+
+    Parameters:
+    path (str): File to read
+
+    Returns:
+    tuple: (samples dict, metadata dict), or (None, None) if there is no saved posterior
+    """
+    if not os.path.exists(path):
+        return None, None
+
+    with np.load(path) as npz:
+        meta = json.loads(str(npz["__meta__"]))
+        samples = {
+            key[len("sample__"):]: npz[key]
+            for key in npz.files
+            if key.startswith("sample__")
+        }
+    return samples, meta
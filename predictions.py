@@ -1,49 +1,223 @@
 #Read in packages
-from build_data import data_hr
+import functools
 import pandas as pd
-import datetime as dt
-import numpyro
-import numpyro.distributions as dist
-import jax.numpy as jnp
-from jax import random
-from numpyro.infer import MCMC, NUTS, Predictive
-import arviz as az
-from model_data import baseline_mcmc, model, mcmc
+import numpy as np
 teams = pd.read_csv("formatting/teams.csv")
 
+#Posterior sites the goal rates are built from
+PREDICTIVE_SITES = ["atts", "defs", "home", "intercerpt"]
+
+#Games simulated at once by iter_goal_chunks() - memory is bounded by game_chunk x draws
+GAME_CHUNK = 64
+
+#Most goals (games x draws) sim_schedule_left() simulates at once, so the working memory on
+#top of its result stays small however many draws there are
+PREDICT_CHUNK_GOALS = 500000
+
 #As this runs at 12:01 GMT, we need to include any games that have the current date as well as
 #they will be played that evening.
-schedule_left = data_hr[data_hr['home_score'].isna()]
-
-#Define function to use posterior predictions and generate, for each game remaining, 2000 runs of home and away goals
-def sim_schedule_left(schedule_left,mcmc, model):
-    #Get current points for each teams in array
-    
-    try:
-        #Get predictive samples from mcmc 
-        post_samples = mcmc.get_samples()
-
-        #Get the remaining schedule team codes
-        games_left = schedule_left[['home_ix','away_ix']].copy()
-        #No factor of decay for future games
-        games_left['days_since'] = 0
-        x_pred = games_left.values
-
-        #Set numpyro predictive to create predictive samples
-        predictive = Predictive(model, posterior_samples=post_samples, return_sites=['home_goals','away_goals'])
-        samples_predictive = predictive(random.PRNGKey(0), x_pred, None, None)
-
-        #print("extracting goals")
-        #Extract the predicted goals for each game. This will return 2000 samples for each team in each game. 
-        home_goals = jnp.array(samples_predictive["home_goals"]).T
-        away_goals = jnp.array(samples_predictive["away_goals"]).T
-
-    except:
-        home_goals, away_goals = [],[]
+def remaining_schedule(data_hr):
+    """Games without a score yet, i.e. still to be played."""
+    return data_hr[data_hr['home_score'].isna()]
+
+
+@functools.lru_cache(maxsize=None)
+def _goal_rates_kernel():
+    """Jitted goal rate kernel, built on first use so importing this module doesn't load jax."""
+    import jax
+    import jax.numpy as jnp
+    from compile_cache import enable_compilation_cache
+
+    enable_compilation_cache()
+
+    @jax.jit
+    def goal_rates(atts, defs, home, intercept, home_ix, away_ix):
+        home_lambda = jnp.exp(intercept[:, None] + home[:, None] + atts[:, home_ix] + defs[:, away_ix])
+        away_lambda = jnp.exp(intercept[:, None] + atts[:, away_ix] + defs[:, home_ix])
+        return home_lambda, away_lambda
+
+    return goal_rates
+
+
+def _goal_rates(atts, defs, home, intercept, home_ix, away_ix):
+    """Expected home and away goals for every draw and game, as in model_data.model."""
+    return _goal_rates_kernel()(atts, defs, home, intercept, home_ix, away_ix)
+
+
+def shared_uniforms(rng, shape, n_scenarios):
+    """
+    Uniforms for draws stacked as n_scenarios equal blocks along the last axis, the same in
+    every block, so each scenario sees the random numbers of the first.
+    """
+    n_draws = shape[-1] // n_scenarios
+    return np.tile(rng.random(tuple(shape[:-1]) + (n_draws,)), n_scenarios)
+
+
+def _poisson(rng, rates, n_scenarios=1):
+    """
+    Poisson draws by inverse CDF from shared_uniforms(), for common random numbers.
+
+    Scenarios whose rates differ then differ only where the rates move a draw across a goal,
+    rather than by independent goal noise. About 1.6x slower than rng.poisson, so the daily
+    simulation doesn't use it.
+    """
+    rates = np.asarray(rates, dtype=np.float64)
+    uniforms = shared_uniforms(rng, rates.shape, n_scenarios)
+    prob = np.exp(-rates)
+    cdf = prob.copy()
+    goals = np.zeros(rates.shape, dtype=np.int16)
+    above = uniforms > cdf
+    k = 0
+    #The cdf can round to just under 1, so stop once the remaining probability is gone
+    while above.any() and k < 100:
+        k += 1
+        prob *= rates / k
+        cdf += prob
+        goals += above
+        above &= uniforms > cdf
+    return goals
+
+
+def _predictive_arrays(post_samples):
+    """Check the posterior has what the sampler needs and return it as flat arrays."""
+    missing = [site for site in PREDICTIVE_SITES if site not in post_samples]
+    if missing:
+        raise ValueError(f"Posterior samples are missing {missing}, can't simulate the remaining games")
+
+    atts = np.asarray(post_samples["atts"], dtype=np.float32)
+    defs = np.asarray(post_samples["defs"], dtype=np.float32)
+    n_teams = atts.shape[-1]
+    #Samples kept per chain are flattened into one set of draws
+    atts, defs = atts.reshape(-1, n_teams), defs.reshape(-1, n_teams)
+    home = np.asarray(post_samples["home"], dtype=np.float32).reshape(-1)
+    intercept = np.asarray(post_samples["intercerpt"], dtype=np.float32).reshape(-1)
+
+    n_draws = len(atts)
+    if not (len(defs) == len(home) == len(intercept) == n_draws):
+        raise ValueError(
+            f"Posterior sites have different numbers of draws: atts {len(atts)}, defs {len(defs)}, "
+            f"home {len(home)}, intercerpt {len(intercept)}"
+        )
+    return atts, defs, home, intercept
+
+
+def _schedule_indexes(schedule_left, n_teams):
+    """Home and away team indexes of the remaining games, checked against the posterior."""
+    home_ix = schedule_left['home_ix'].to_numpy(dtype=np.int32)
+    away_ix = schedule_left['away_ix'].to_numpy(dtype=np.int32)
+    if len(home_ix) and (min(home_ix.min(), away_ix.min()) < 0 or max(home_ix.max(), away_ix.max()) >= n_teams):
+        raise ValueError(f"Remaining schedule has team indexes outside the {n_teams} teams in the posterior")
+    return home_ix, away_ix
+
+
+#Define function to use posterior predictions and generate, for each game remaining, a run of home and away goals per posterior draw
+def sim_schedule_left(schedule_left, post_samples, seed=0, game_chunk=None):
+    """
+    Simulate goals for every remaining game from the posterior, one run per posterior draw.
+
+    Goal rates are computed straight from the posterior ratings, so the model (priors and
+    the decay weights, which are always 1 for future games) isn't traced again. Goals come
+    from iter_goal_chunks() and are written into int16 arrays, so beyond the result only one
+    chunk of games is held at once.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games with 'home_ix' and 'away_ix'
+    post_samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    seed (int): Seed for the goal draws
+    game_chunk (int): Games simulated at once, by default as many as PREDICT_CHUNK_GOALS allows
+
+    Returns:
+    tuple: Home goals and away goals, each an int16 array with shape (n_games, n_draws)
+    """
+    n_draws = len(_predictive_arrays(post_samples)[0])
+    game_chunk = game_chunk or max(1, min(GAME_CHUNK, PREDICT_CHUNK_GOALS // max(n_draws, 1)))
+    home_goals = np.empty((len(schedule_left), n_draws), dtype=np.int16)
+    away_goals = np.empty((len(schedule_left), n_draws), dtype=np.int16)
+
+    start = 0
+    for games, chunk_home, chunk_away in iter_goal_chunks(schedule_left, post_samples, seed, game_chunk):
+        home_goals[start:start + len(games)] = chunk_home
+        away_goals[start:start + len(games)] = chunk_away
+        start += len(games)
 
     return home_goals, away_goals
 
 
-#Get samples of home_goals and away_goals for each game left
-home_goals, away_goals = sim_schedule_left(schedule_left, mcmc, model)
+def iter_goal_chunks(schedule_left, post_samples, seed=0, game_chunk=GAME_CHUNK, n_scenarios=None):
+    """
+    Simulate goals for the remaining games a chunk of games at a time.
+
+    Every posterior draw is simulated for each chunk, so the caller can fold the goals
+    into per-team totals without the full (n_games, n_draws) arrays ever existing.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games with 'home_ix' and 'away_ix'
+    post_samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    seed (int): Seed for the goal draws
+    game_chunk (int): Games simulated at once
+    n_scenarios (int): If given, the draws are that many scenarios stacked along the draw
+        axis, and every scenario's goals come from the same random numbers (see _poisson)
+
+    Yields:
+    tuple: The chunk's rows of schedule_left, then home and away goals as int16 arrays
+        with shape (games in chunk, n_draws)
+    """
+    atts, defs, home, intercept = _predictive_arrays(post_samples)
+    home_ix, away_ix = _schedule_indexes(schedule_left, atts.shape[1])
+    n_games = len(home_ix)
+    if n_games == 0:
+        return
+
+    game_chunk = min(game_chunk, n_games)
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_games, game_chunk):
+        stop = min(start + game_chunk, n_games)
+        #The last chunk is padded to full size so the kernel is only compiled once
+        games = np.arange(start, start + game_chunk) % n_games
+        home_lambda, away_lambda = _goal_rates(atts, defs, home, intercept, home_ix[games], away_ix[games])
+        home_lambda = np.asarray(home_lambda)[:, :stop - start].T
+        away_lambda = np.asarray(away_lambda)[:, :stop - start].T
+        if n_scenarios is None:
+            home_goals = rng.poisson(home_lambda).astype(np.int16)
+            away_goals = rng.poisson(away_lambda).astype(np.int16)
+        else:
+            home_goals = _poisson(rng, home_lambda, n_scenarios)
+            away_goals = _poisson(rng, away_lambda, n_scenarios)
+        yield schedule_left.iloc[start:stop], home_goals, away_goals
+
+
+def game_lambdas(samples, home_ix, away_ix):
+    """
+    Expected home and away goals for each posterior draw and game.
+
+    Parameters:
+    samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    home_ix (array): Home team index per game
+    away_ix (array): Away team index per game
+
+    Returns:
+    tuple: Home and away lambdas, each with shape (n_draws, n_games)
+    """
+    atts = np.asarray(samples["atts"])
+    defs = np.asarray(samples["defs"])
+    base = np.asarray(samples["intercerpt"])[:, None]
+    home_lambda = np.exp(base + np.asarray(samples["home"])[:, None] + atts[:, home_ix] + defs[:, away_ix])
+    away_lambda = np.exp(base + atts[:, away_ix] + defs[:, home_ix])
+    return home_lambda, away_lambda
+
+
+def outcome_probs(samples, home_ix, away_ix):
+    """
+    Posterior probability of a home win, a tie after regulation and an away win per game.
+
+    Uses the exact Skellam distribution of the goal difference, so there's no Monte Carlo noise.
+
+    Returns:
+    tuple: (p_home, p_tie, p_away) arrays with one value per game
+    """
+    from scipy.stats import skellam
 
+    home_lambda, away_lambda = game_lambdas(samples, home_ix, away_ix)
+    p_tie = skellam.pmf(0, home_lambda, away_lambda).mean(axis=0)
+    p_home = skellam.sf(0, home_lambda, away_lambda).mean(axis=0)
+    return p_home, p_tie, 1 - p_home - p_tie
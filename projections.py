@@ -1,122 +1,456 @@
 #Read in packages
+import os
 import pandas as pd
 import datetime as dt
 import numpy as np
-import arviz as az
-from model_data import results
-from predictions import home_goals, away_goals, schedule_left
 from datetime import datetime
+from point_codec import encode_histogram
+from standings import team_totals
 
 teams = pd.read_csv("formatting/teams.csv")
 
-results_current = results[results['Date'] > "2024-10-01"]
+#Games after this date count towards the current standings
+CURRENT_SEASON_START = "2024-10-01"
 
+#Raw simulated seasons of the last run, saved next to the CSV outputs so the odds can be
+#recomputed offline with playoffs.season_playoff_table without simulating again
+POINT_SAMPLES_PATH = "data/point_samples.npz"
 
-#Next we need to sort out poi
-def simResults(schedule, homeGoals, awayGoals, teams):
 
+#Precision targets of project_points_adaptive() (FACEOFF_ADAPTIVE=1 in pipeline.py): seasons
+#are simulated in batches of ADAPTIVE_BATCH draws until the Monte Carlo standard error of every
+#team's mean points and playoff odds is on target, between ADAPTIVE_MIN_DRAWS and
+#ADAPTIVE_MAX_DRAWS draws. A settled March needs far fewer draws than October. The errors allow
+#for autocorrelated NUTS draws, so a posterior with too few effective draws stops the run early
+#and reports how many it would need. The default 2000-draw posterior can't reach these targets
+#early in the season: October needs FACEOFF_NUM_SAMPLES of about 25000 (with
+#FACEOFF_LOW_MEMORY=1), March a few thousand.
+TARGET_POINTS_SE = float(os.getenv("FACEOFF_TARGET_POINTS_SE", "0.1"))
+TARGET_ODDS_SE = float(os.getenv("FACEOFF_TARGET_ODDS_SE", "0.005"))
+ADAPTIVE_BATCH = 1000
+ADAPTIVE_MIN_DRAWS = ADAPTIVE_BATCH
+ADAPTIVE_MAX_DRAWS = 50000
 
+#Probability that a tied game goes to a shootout rather than being settled in overtime
+SHOOTOUT_PROB = 0.344
+#Probability that the home team wins a shootout/overtime
+HOME_SO_WIN_PROB = 0.5
+HOME_OT_WIN_PROB = 0.5
 
-    home_dict = dict.fromkeys(teams['team'])
-    away_dict = dict.fromkeys(teams['team'])
-    
-    for team in teams['team']:
-        home_dict[team] = []
-        away_dict[team] = []
+def _team_sums(team_ix, values, n_teams):
+    """
+    Sum per-game rows onto the team that played each game, i.e. np.add.at by team index.
 
-    for i in range(len(schedule)):
-        home_team = schedule.iloc[i]['Home']
-        away_team = schedule.iloc[i]['Visitor']
-        
-        homePoints = np.zeros(homeGoals.shape[1])
-        awayPoints = np.zeros(awayGoals.shape[1])
+    Done as a (n_teams x n_games) one-hot matrix product, which is much faster than
+    np.add.at and exact for whole-number values.
+    """
+    return np.eye(n_teams)[team_ix].T @ values.astype(float)
 
-        for j in range(homeGoals.shape[1]):
+#Next we need to sort out points for every remaining game and every posterior draw
+def simResults(schedule, homeGoals, awayGoals, teams, seed=0, n_scenarios=None):
+    """
+    Simulate points for the remaining schedule across all posterior draws at once.
 
-            if homeGoals[i][j] > awayGoals[i][j]:
-                homePoints[j] = 2
-            elif homeGoals[i][j] < awayGoals[i][j]:
-                awayPoints[j] = 2
-            else:  # This implies a draw
-                homePoints[j] = 1
-                awayPoints[j] = 1
-                # Now, determine SO or OT
-                if np.random.uniform(low=0, high=1) < 0.344:  # Chance of going to shootout
-                    note = 'SO'
-                    if np.random.uniform(low=0, high=1) < 0.5:
-                        homePoints[j] = 2  # Home wins in shootout
-                        awayPoints[j] = 1
-                    else:
-                        homePoints[j] = 1
-                        awayPoints[j] = 2  # Away wins in shootout
-                else:
-                    note = 'OT'
-                    if np.random.uniform(low=0, high=1) < 0.5:
-                        homePoints[j] = 2  # Home wins in overtime
-                        awayPoints[j] = 1
-                    else:
-                        homePoints[j] = 1
-                        awayPoints[j] = 2  # Away wins in overtime
+    Parameters:
+    schedule (DataFrame): Remaining games, must contain 'home_ix' and 'away_ix'
+    homeGoals (array): Simulated home goals with shape (n_games, n_draws)
+    awayGoals (array): Simulated away goals with shape (n_games, n_draws)
+    teams (DataFrame): DataFrame containing team information
+    seed (int): Seed for the generator used to settle games that go past regulation
+    n_scenarios (int): If given, the draws are that many stacked scenarios, settled with the
+        same random numbers
 
+    Returns:
+    tuple: Arrays of home points and away points per team, each with shape (n_teams, n_draws)
+    """
+    homeGoals = np.asarray(homeGoals)
+    awayGoals = np.asarray(awayGoals)
+    n_teams = len(teams)
+    n_draws = homeGoals.shape[1] if homeGoals.ndim == 2 else 0
 
+    home_points = np.zeros((n_teams, n_draws))
+    away_points = np.zeros((n_teams, n_draws))
+    if len(schedule) == 0 or n_draws == 0:
+        return home_points, away_points
 
-        home_dict[home_team].append(homePoints)
-        away_dict[away_team].append(awayPoints)
+    rng = np.random.default_rng(seed)
 
-    return home_dict, away_dict
+    home_win = homeGoals > awayGoals
+    away_win = homeGoals < awayGoals
+    tie = ~(home_win | away_win)
 
-home_dict, away_dict = simResults(schedule_left, home_goals, away_goals, teams)
+    #A tied game is settled in a shootout or in overtime, either way the winner gets 2 points
+    #and the loser 1, so one uniform per draw decides whether the home team takes the extra point
+    home_extra_prob = SHOOTOUT_PROB * HOME_SO_WIN_PROB + (1 - SHOOTOUT_PROB) * HOME_OT_WIN_PROB
+    if n_scenarios is None:
+        home_extra = np.zeros(tie.shape, dtype=bool)
+        home_extra[tie] = rng.uniform(size=np.count_nonzero(tie)) < home_extra_prob
+    else:
+        #Stacked scenarios share one uniform per game and draw, tied or not
+        from predictions import shared_uniforms
 
-for key in home_dict:
-    home_dict[key] = np.array(home_dict[key]).sum(axis=0)
-    away_dict[key] = np.array(away_dict[key]).sum(axis=0)
+        home_extra = tie & (shared_uniforms(rng, tie.shape, n_scenarios) < home_extra_prob)
 
+    game_home_points = 2 * home_win + tie + home_extra
+    game_away_points = 2 * away_win + 2 * tie - home_extra
 
-# Now, combine the results into a single dictionary
-total_points = {}
-for key in home_dict:
-    # This will add the points from home and away matches
-    # It assumes all keys in home_dict are also in away_dict
-    total_points[key] = home_dict[key] + away_dict[key]
+    #Scatter-add each game's points onto the team that played it
+    home_points += _team_sums(schedule['home_ix'].values, game_home_points, n_teams)
+    away_points += _team_sums(schedule['away_ix'].values, game_away_points, n_teams)
 
-import numpy as np
+    return home_points, away_points
+
+def simRegulationWins(schedule, homeGoals, awayGoals, teams):
+    """
+    Count regulation wins per team for the remaining schedule across all posterior draws.
+
+    Regulation wins are the first NHL tiebreaker. A game decided in regulation is one where
+    the simulated goals differ, so no extra randomness is needed.
+
+    Returns:
+    array: Regulation wins per team with shape (n_teams, n_draws)
+    """
+    homeGoals = np.asarray(homeGoals)
+    awayGoals = np.asarray(awayGoals)
+    n_draws = homeGoals.shape[1] if homeGoals.ndim == 2 else 0
+
+    regulation_wins = np.zeros((len(teams), n_draws))
+    if len(schedule) == 0 or n_draws == 0:
+        return regulation_wins
+
+    regulation_wins += _team_sums(schedule['home_ix'].values, homeGoals > awayGoals, len(teams))
+    regulation_wins += _team_sums(schedule['away_ix'].values, awayGoals > homeGoals, len(teams))
+    return regulation_wins
+
+def project_points(schedule_left, home_goals, away_goals, results, teams, seed=0):
+    """
+    Final points per team and draw: current points plus the simulated remaining schedule.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games
+    home_goals (array): Simulated home goals with shape (n_games, n_draws)
+    away_goals (array): Simulated away goals with shape (n_games, n_draws)
+    results (DataFrame): Completed games
+    teams (DataFrame): DataFrame containing team information
+    seed (int): Seed for settling games that go past regulation
+
+    Returns:
+    tuple: Final points and regulation wins over the remaining games, each (n_teams, n_draws)
+    """
+    home_points, away_points = simResults(schedule_left, home_goals, away_goals, teams, seed)
+    regulation_wins_left = simRegulationWins(schedule_left, home_goals, away_goals, teams)
+    return _add_current_points(home_points + away_points, results, teams), regulation_wins_left
+
+
+def project_points_streaming(schedule_left, post_samples, results, teams, seed=0, game_chunk=None,
+                             n_scenarios=None):
+    """
+    project_points() for the memory-bounded mode, simulating straight from the posterior.
+
+    Goals are drawn a chunk of games at a time and folded into per-team point and
+    regulation win totals, so only (n_teams, n_draws) accumulators and one chunk of goals
+    are held at once rather than every game's goals for every draw.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games
+    post_samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    results (DataFrame): Completed games
+    teams (DataFrame): DataFrame containing team information
+    seed (int): Seed for the goal draws and for settling games that go past regulation
+    game_chunk (int): Games simulated at once, predictions.GAME_CHUNK by default
+    n_scenarios (int): If given, post_samples holds that many scenarios stacked along the draw
+        axis, simulated with common random numbers so they differ only by the scenario
+
+    Returns:
+    tuple: Final points and regulation wins over the remaining games, each (n_teams, n_draws)
+    """
+    from predictions import GAME_CHUNK, iter_goal_chunks
+
+    game_chunk = game_chunk or GAME_CHUNK
+    n_draws = np.asarray(post_samples["atts"]).reshape(-1, len(teams)).shape[0]
+    points_left = np.zeros((len(teams), n_draws))
+    regulation_wins_left = np.zeros((len(teams), n_draws))
+
+    #Each chunk settles its overtime games with its own independent stream
+    n_chunks = -(-len(schedule_left) // game_chunk)
+    chunk_seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    chunks = iter_goal_chunks(schedule_left, post_samples, seed, game_chunk, n_scenarios)
+    for chunk_seed, (games, home_goals, away_goals) in zip(chunk_seeds, chunks):
+        home_points, away_points = simResults(games, home_goals, away_goals, teams, chunk_seed, n_scenarios)
+        points_left += home_points
+        points_left += away_points
+        regulation_wins_left += simRegulationWins(games, home_goals, away_goals, teams)
+
+    return _add_current_points(points_left, results, teams), regulation_wins_left
+
+
+def _current_standings(results, teams):
+    """Points and regulation wins per team in the current season, in the order of teams."""
+    results_current = results[results['Date'] > CURRENT_SEASON_START]
+    return team_totals(results_current, teams)
+
+
+def _add_current_points(points_left, results, teams):
+    """Final points per team and draw: points in the standings today plus points_left."""
+    current_points = _current_standings(results, teams)['points'].values
+    return points_left[teams['team_index'].values] + current_points[:, None]
+
+
+def posterior_draw_index(n_draws, n_posterior, seed=0):
+    """
+    Posterior draw behind each season simulated by project_points_adaptive(): passes through
+    the posterior in one shuffled order, repeated, so stopping early still spreads the
+    seasons over every chain.
+    """
+    order = np.random.default_rng(seed).permutation(n_posterior)
+    return order[np.arange(n_draws) % n_posterior]
+
+
+def _made_playoffs(points, regulation_wins_left, results, teams, seed=0):
+    """Whether each team makes the playoffs in each simulated season, shape (n_teams, n_draws)."""
+    from playoffs import ranking_keys, simulate_spots
+
+    regulation_wins = _current_standings(results, teams)['regulation_wins'].values[:, None] + regulation_wins_left
+    spots = simulate_spots(points, ranking_keys(points, regulation_wins, seed), teams.sort_values('team_index'))
+    return spots['division_top3'] | spots['wildcard']
+
+
+def _batch_means_se(values, draws, n_posterior):
+    """
+    Standard error of each row's mean over seasons simulated from autocorrelated posterior draws.
 
-def calcPoints(df, team_name):
-    # Filter data once per team (more efficient than twice if data is large)
-    is_home = df['Home'] == team_name
-    is_away = df['Visitor'] == team_name
+    Seasons are grouped into about sqrt(n_posterior) batches of consecutive posterior draws,
+    in the order they were sampled, and the error comes from the spread of the batch means,
+    so neighbouring draws that tell the same story don't count as independent. Seasons that
+    share a draw differ only by goal noise, which more seasons average away; what's left is
+    the posterior's own error, set by its effective sample size.
 
-    # Home team points calculation
-    home_wins = np.where((is_home) & (df['G.1'] > df['G']), 2, 0)
-    home_otl = np.where((is_home) & (df['G.1'] < df['G']) & (df['Shootout'].notna()), 1, 0)
+    Parameters:
+    values (array): Value per row and season, shape (n_rows, n_draws)
+    draws (array): Posterior draw index of each season
+    n_posterior (int): Number of posterior draws
 
-    # Away team points calculation
-    away_wins = np.where((is_away) & (df['G'] > df['G.1']), 2, 0)
-    away_otl = np.where((is_away) & (df['G'] < df['G.1']) & (df['Shootout'].notna()), 1, 0)
+    Returns:
+    tuple: Standard error per row, and the part of it from the posterior, nan until some
+        draw has been simulated more than once
+    """
+    values = np.asarray(values, dtype=float)
+    n_draws = len(draws)
+    n_batches = max(int(np.sqrt(n_posterior)), 2)
+    batch = draws * n_batches // n_posterior
+    counts = np.bincount(batch, minlength=n_batches)
+    used = counts > 0
+    batch_means = np.stack([np.bincount(batch, weights=row, minlength=n_batches)[used] for row in values]) / counts[used]
+    share = counts[used] / n_draws
+    k = used.sum()
+    mean = values.mean(axis=1, keepdims=True)
+    se = np.sqrt(k / max(k - 1, 1) * ((share * (batch_means - mean)) ** 2).sum(axis=1))
 
-    # Summing all points
-    total_points = np.sum(home_wins) + np.sum(home_otl) + np.sum(away_wins) + np.sum(away_otl)
-    return np.zeros(2000) + total_points
+    #Goal noise, from the spread between seasons of the same posterior draw
+    draw_counts = np.bincount(draws, minlength=n_posterior)
+    repeated = draw_counts > 1
+    dof = (draw_counts[repeated] - 1).sum()
+    if dof == 0:
+        return se, np.full(len(values), np.nan)
+    sums = np.stack([np.bincount(draws, weights=row, minlength=n_posterior) for row in values])[:, repeated]
+    squares = np.stack([np.bincount(draws, weights=row ** 2, minlength=n_posterior) for row in values])[:, repeated]
+    within = (squares - sums ** 2 / draw_counts[repeated]).sum(axis=1) / dof
+    return se, np.sqrt(np.maximum(se ** 2 - within / n_draws, 0))
 
-# Calculate and update points for each team
-for team in teams["team"]:
-    current_season_points = calcPoints(results_current, team)
-    if team in total_points:
-        total_points[team] += current_season_points
+
+def monte_carlo_errors(points, regulation_wins_left, results, teams, seed=0, draws=None, n_posterior=None):
+    """
+    Monte Carlo standard errors of each team's mean points and playoff odds.
+
+    Parameters:
+    points (array): Final points per team and draw, shape (n_teams, n_draws)
+    regulation_wins_left (array): Regulation wins over the remaining games, same shape
+    results (DataFrame): Completed games
+    teams (DataFrame): Team information including 'division' and 'conference'
+    seed (int): Seed for random tiebreaks
+    draws (array): Posterior draw index of each season, by default one season per draw in order
+    n_posterior (int): Number of posterior draws, by default the number of seasons
+
+    Returns:
+    tuple: Standard errors of mean points and of playoff odds, then the part of each that more
+        seasons can't remove as it comes from the posterior (nan until a draw is reused), one
+        value per team
+    """
+    n_draws = points.shape[1]
+    draws = np.arange(n_draws) if draws is None else np.asarray(draws)
+    n_posterior = n_draws if n_posterior is None else n_posterior
+    made_playoffs = _made_playoffs(points, regulation_wins_left, results, teams, seed)
+    points_se, points_posterior_se = _batch_means_se(points, draws, n_posterior)
+    odds_se, odds_posterior_se = _batch_means_se(made_playoffs, draws, n_posterior)
+    return points_se, odds_se, points_posterior_se, odds_posterior_se
+
+
+def precision_summary(points, regulation_wins_left, results, teams, seed=0, draws=None, n_posterior=None,
+                      target_points_se=None, target_odds_se=None):
+    """
+    Draws simulated, the largest Monte Carlo standard errors and whether they are on target.
+
+    The targets can't be met when the posterior's part of an error is already above them -
+    only a longer or thinner NUTS run helps then, not more simulated seasons. That part falls
+    with the square root of the posterior draws, which gives the draws needed to reach both
+    targets.
+
+    Parameters:
+    As monte_carlo_errors(), with the targets defaulting to TARGET_POINTS_SE and TARGET_ODDS_SE
+
+    Returns:
+    dict: For the run report and project_points_adaptive()
+    """
+    target_points_se = TARGET_POINTS_SE if target_points_se is None else target_points_se
+    target_odds_se = TARGET_ODDS_SE if target_odds_se is None else target_odds_se
+    points_se, odds_se, points_posterior_se, odds_posterior_se = monte_carlo_errors(
+        points, regulation_wins_left, results, teams, seed, draws, n_posterior
+    )
+
+    def largest(values):
+        return None if np.isnan(values).all() else float(np.nanmax(values))
+
+    n_posterior = points.shape[1] if n_posterior is None else n_posterior
+    max_posterior_points_se = largest(points_posterior_se)
+    max_posterior_odds_se = largest(odds_posterior_se)
+    if max_posterior_points_se is None:
+        posterior_draws_needed = None
     else:
-        total_points[team] = np.zeros(2000) + current_season_points
+        shortfall = max((max_posterior_points_se / target_points_se) ** 2, (max_posterior_odds_se / target_odds_se) ** 2)
+        posterior_draws_needed = int(np.ceil(n_posterior * shortfall))
+
+    return {
+        "draws": points.shape[1],
+        "posterior_draws": n_posterior,
+        "posterior_draws_needed": posterior_draws_needed,
+        "max_points_se": float(points_se.max()),
+        "max_odds_se": float(odds_se.max()),
+        "max_posterior_points_se": max_posterior_points_se,
+        "max_posterior_odds_se": max_posterior_odds_se,
+        "target_points_se": target_points_se,
+        "target_odds_se": target_odds_se,
+        "on_target": bool(points_se.max() <= target_points_se and odds_se.max() <= target_odds_se),
+        "posterior_limited": bool((points_posterior_se > target_points_se).any()
+                                  or (odds_posterior_se > target_odds_se).any()),
+    }
+
+
+def project_points_adaptive(schedule_left, post_samples, results, teams, seed=0,
+                            target_points_se=None, target_odds_se=None, batch_draws=ADAPTIVE_BATCH,
+                            min_draws=ADAPTIVE_MIN_DRAWS, max_draws=ADAPTIVE_MAX_DRAWS):
+    """
+    project_points() with as many draws as it takes to reach the precision targets.
+
+    Batches of seasons are simulated with project_points_streaming() until the largest
+    Monte Carlo standard error of mean points and of playoff odds are both on target, the
+    posterior's effective sample size is what's holding them up, or max_draws is reached.
+    Seasons take posterior draws in the order of posterior_draw_index(), so once the
+    posterior runs out draws are reused with fresh goals.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games
+    post_samples (dict): Posterior samples with 'atts', 'defs', 'home' and 'intercerpt'
+    results (DataFrame): Completed games
+    teams (DataFrame): DataFrame containing team information
+    seed (int): Seed for the resampling, the goal draws and settling games past regulation
+    target_points_se (float): Target standard error of mean points, TARGET_POINTS_SE by default
+    target_odds_se (float): Target standard error of playoff odds, TARGET_ODDS_SE by default
+    batch_draws (int): Draws simulated per batch
+    min_draws (int): Draws simulated before the targets are checked
+    max_draws (int): Draws after which it stops even if the targets aren't met
+
+    Returns:
+    tuple: Final points and regulation wins over the remaining games, each (n_teams, n_draws),
+        and the precision_summary() of the last check
+    """
+    #Samples kept per chain are flattened into one set of draws
+    flat = {
+        "atts": np.asarray(post_samples["atts"]).reshape(-1, len(teams)),
+        "defs": np.asarray(post_samples["defs"]).reshape(-1, len(teams)),
+        "home": np.asarray(post_samples["home"]).reshape(-1),
+        "intercerpt": np.asarray(post_samples["intercerpt"]).reshape(-1),
+    }
+    n_posterior = len(flat["atts"])
+    draw_index = posterior_draw_index(max_draws + batch_draws, n_posterior, seed)
+
+    seeds = np.random.SeedSequence(seed)
+    points, regulation_wins_left = [], []
+    n_draws = 0
+    while True:
+        batch = {site: values[draw_index[n_draws:n_draws + batch_draws]] for site, values in flat.items()}
+        batch_seed = int(seeds.spawn(1)[0].generate_state(1)[0])
+        batch_points, batch_wins = project_points_streaming(schedule_left, batch, results, teams, batch_seed)
+        points.append(batch_points)
+        regulation_wins_left.append(batch_wins)
+        n_draws += batch_draws
+
+        if n_draws < min_draws and n_draws < max_draws:
+            continue
+        all_points, all_wins = np.concatenate(points, axis=1), np.concatenate(regulation_wins_left, axis=1)
+        points, regulation_wins_left = [all_points], [all_wins]
+        precision = precision_summary(
+            all_points, all_wins, results, teams, seed, draw_index[:n_draws], n_posterior,
+            target_points_se, target_odds_se,
+        )
+        if precision["on_target"] or precision["posterior_limited"] or n_draws >= max_draws:
+            break
+
+    print(
+        f"Simulated {n_draws} seasons from {n_posterior} posterior draws: points se "
+        f"{precision['max_points_se']:.3f} (target {precision['target_points_se']}), playoff odds se "
+        f"{precision['max_odds_se']:.4f} (target {precision['target_odds_se']})"
+        + ("" if precision["on_target"]
+           else " - the posterior's effective sample size is too small to reach the targets, keep about "
+           f"{precision['posterior_draws_needed']} posterior draws (FACEOFF_NUM_SAMPLES / FACEOFF_THIN)"
+           if precision["posterior_limited"] else " - stopped at the draw limit")
+    )
+    return all_points, all_wins, precision
+
+
+def save_point_samples(points, regulation_wins_left, path=POINT_SAMPLES_PATH):
+    """Keep the raw samples for offline analysis - regulation wins are only the remaining games."""
+    np.savez_compressed(path, points=points, regulation_wins_left=regulation_wins_left)
+
+
+def point_projections(points, teams, date=None):
+    """
+    Table of each team's simulated final points for team_points.
+
+    Parameters:
+    points (array): Final points with shape (n_teams, n_draws)
+    teams (DataFrame): DataFrame containing team information
+    date (str): Date to stamp the table with, today by default
+
+    Returns:
+    DataFrame: Columns team, points and date
+    """
+    #Store each team's samples as a compact histogram rather than a stringified list of floats
+    df_points = pd.DataFrame({
+        'team': teams['team'].values,
+        'points': [encode_histogram(team_points) for team_points in points],
+    })
+
+    # Add a date column with today's date
+    df_points['date'] = date or datetime.today().strftime('%Y-%m-%d')
+    return df_points
+
+
+def main():
+    from build_data import build_games
+    from model_data import get_posterior, prepare_results
+    from predictions import remaining_schedule, sim_schedule_left
 
-    #if isinstance(total_points[team], np.ndarray):
-    total_points[team] = "[" + ",".join(map(str,total_points[team])) + "]"
-    #else:
-        # Handle the case where total_points[team] is a single number - end of season only
-        #total_points[team] = "[" + str(total_points[team]) + "]"
+    data_hr = build_games()
+    results = prepare_results(data_hr)
+    schedule_left = remaining_schedule(data_hr)
 
-#Conversion for storage
-df_points = pd.DataFrame(list(total_points.items()), columns=['team', 'points'])
+    #Get samples of home_goals and away_goals for each game left
+    home_goals, away_goals = sim_schedule_left(schedule_left, get_posterior(results))
 
-# Add a date column with today's date
-df_points['date'] = datetime.today().strftime('%Y-%m-%d')
+    points, regulation_wins_left = project_points(schedule_left, home_goals, away_goals, results, teams)
+    save_point_samples(points, regulation_wins_left)
+    point_projections(points, teams).to_csv("data/point_projections.csv", index=False)
 
 
-df_points.to_csv("data/point_projections.csv", index=False)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
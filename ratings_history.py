@@ -0,0 +1,152 @@
+#Read in packages
+import os
+import json
+import numpy as np
+import pandas as pd
+
+#Daily posterior summaries, one Parquet file per date under date=YYYY-MM-DD/ so a day is
+#appended (or replaced) without rewriting the rest and readers can filter on date and team
+HISTORY_DIR = "data/ratings_history"
+
+#Dates already upserted into team_rating_history, so only new summaries are pushed.
+#Files starting with _ are skipped when the directory is read as a dataset.
+PUSHED_FILE = "_pushed.json"
+
+#Probability mass of the highest density intervals
+HDI_PROB = 0.9
+
+#Summarised parameters and the posterior site each comes from. atts/defs are the zero-sum
+#ratings, home advantage is league-wide so it is repeated on every team's row.
+PARAMETERS = {"attack": "atts", "defense": "defs", "home": "home"}
+
+
+def hdi(samples, prob=HDI_PROB):
+    """
+    Narrowest interval holding prob of the draws, for every column at once.
+
+    Parameters:
+    samples (array): Draws along the first axis
+    prob (float): Probability mass of the interval
+
+    Returns:
+    tuple: Lower and upper bounds, each shaped like samples without the first axis
+    """
+    ordered = np.sort(np.asarray(samples, dtype=float), axis=0)
+    n_draws = ordered.shape[0]
+    n_inside = max(int(np.floor(prob * n_draws)), 1)
+    widths = ordered[n_inside:] - ordered[:n_draws - n_inside]
+    start = np.argmin(widths, axis=0)
+    lower = np.take_along_axis(ordered, start[None], axis=0)[0]
+    upper = np.take_along_axis(ordered, (start + n_inside)[None], axis=0)[0]
+    return lower, upper
+
+
+def summarise_ratings(samples, teams, date, prob=HDI_PROB):
+    """
+    Posterior mean, sd and HDI of each team's attack and defense and of home advantage.
+
+    Parameters:
+    samples (dict): Posterior samples with 'atts', 'defs' and 'home'
+    teams (DataFrame): Team information, ordered by team_index
+    date (str): Date of the fit
+    prob (float): Probability mass of the HDIs
+
+    Returns:
+    DataFrame: One row per team
+    """
+    teams = teams.sort_values('team_index')
+    summary = pd.DataFrame({
+        'date': date,
+        'team': teams['team'].values,
+        'team_index': teams['team_index'].values,
+    })
+    for name, site in PARAMETERS.items():
+        draws = np.asarray(samples[site], dtype=float)
+        draws = draws.reshape(draws.shape[0], -1)
+        lower, upper = hdi(draws, prob)
+        #Per-team sites give one value per team, league-wide ones are broadcast
+        summary[f'{name}_mean'] = np.broadcast_to(draws.mean(axis=0), len(summary))
+        summary[f'{name}_sd'] = np.broadcast_to(draws.std(axis=0), len(summary))
+        summary[f'{name}_hdi_low'] = np.broadcast_to(lower, len(summary))
+        summary[f'{name}_hdi_high'] = np.broadcast_to(upper, len(summary))
+    return summary
+
+
+def _partition(path, date):
+    return os.path.join(path, f"date={date}")
+
+
+def append_history(summary, path=HISTORY_DIR):
+    """
+    Add a day's summaries to the store, replacing any already kept for that date.
+
+    Parameters:
+    summary (DataFrame): Output of summarise_ratings()
+    path (str): Store directory
+    """
+    for date, day in summary.groupby('date'):
+        partition = _partition(path, date)
+        os.makedirs(partition, exist_ok=True)
+        file_path = os.path.join(partition, "ratings.parquet")
+        tmp_path = file_path + ".tmp"
+        #The date lives in the directory name, sorted by team for cheap team filters
+        day.drop(columns='date').sort_values('team_index').to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, file_path)
+
+
+def read_history(path=HISTORY_DIR, teams=None, start=None, end=None):
+    """
+    Read a slice of the ratings history.
+
+    Parameters:
+    path (str): Store directory
+    teams (list): Team names to keep, all by default
+    start (str): First date to keep (YYYY-MM-DD), inclusive
+    end (str): Last date to keep, inclusive
+
+    Returns:
+    DataFrame: Rows sorted by date and team_index
+    """
+    if not os.path.isdir(path) or not any(name.startswith("date=") for name in os.listdir(path)):
+        return pd.DataFrame(columns=['date', 'team', 'team_index'])
+
+    filters = []
+    if teams is not None:
+        filters.append(('team', 'in', list(teams)))
+    if start is not None:
+        filters.append(('date', '>=', str(start)))
+    if end is not None:
+        filters.append(('date', '<=', str(end)))
+
+    history = pd.read_parquet(path, filters=filters or None)
+    history['date'] = history['date'].astype(str)
+    columns = ['date'] + [col for col in history.columns if col != 'date']
+    return history[columns].sort_values(['date', 'team_index']).reset_index(drop=True)
+
+
+def _pushed_path(path):
+    return os.path.join(path, PUSHED_FILE)
+
+
+def pushed_dates(path=HISTORY_DIR):
+    """Dates whose summaries have been upserted upstream."""
+    if not os.path.exists(_pushed_path(path)):
+        return set()
+    with open(_pushed_path(path)) as file:
+        return set(json.load(file))
+
+
+def unpushed_history(path=HISTORY_DIR):
+    """Summaries for every date not yet upserted upstream - the delta to push."""
+    history = read_history(path)
+    return history[~history['date'].isin(pushed_dates(path))].reset_index(drop=True)
+
+
+def mark_pushed(dates, path=HISTORY_DIR):
+    """Record dates as upserted upstream."""
+    os.makedirs(path, exist_ok=True)
+    pushed = sorted(pushed_dates(path) | {str(date) for date in dates})
+    tmp_path = _pushed_path(path) + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(pushed, file)
+    os.replace(tmp_path, _pushed_path(path))
@@ -0,0 +1,222 @@
+#Read in packages
+import os
+import json
+import argparse
+import datetime
+import numpy as np
+import pandas as pd
+from point_codec import encode_histogram
+
+teams = pd.read_csv("formatting/teams.csv")
+
+#Name of the unchanged scenario every run is compared against
+BASELINE = "baseline"
+
+#Scenario odds written by the CLI
+SCENARIO_PATH = "data/scenario_odds.csv"
+
+#Scenarios are dicts, e.g. loaded from a JSON list:
+#  {"name": "BOS attack -0.1", "ratings": [{"team": "BOS", "attack": -0.1}]}
+#  {"name": "Stronger home ice", "home_advantage": 0.05}
+#  {"name": "Faster decay", "decay_factor": 0.01}
+#  {"name": "BOS beat TOR", "games": [{"home": "BOS", "away": "TOR", "home_goals": 4, "away_goals": 2}]}
+#Rating changes are added to the model's atts/defs for every posterior draw, so a positive
+#defense change means conceding more. Forced games replace the first remaining game between
+#the two teams (or the one on "date") with a result; "overtime": true marks an OT/SO win.
+
+
+def _team(value):
+    from matchups import team_index
+
+    return team_index(value)
+
+
+def perturb_samples(samples, scenario):
+    """
+    Apply a scenario's rating changes to posterior samples.
+
+    Parameters:
+    samples (dict): Posterior samples with 'atts', 'defs' and 'home'
+    scenario (dict): Scenario with optional 'ratings' and 'home_advantage'
+
+    Returns:
+    dict: Samples with the same shapes, changed sites copied
+    """
+    n_teams = len(teams)
+    attack = np.zeros(n_teams, dtype=np.float32)
+    defense = np.zeros(n_teams, dtype=np.float32)
+    for change in scenario.get("ratings", []):
+        ix = _team(change["team"])
+        attack[ix] += change.get("attack", 0.0)
+        defense[ix] += change.get("defense", 0.0)
+
+    perturbed = dict(samples)
+    perturbed["atts"] = np.asarray(samples["atts"]).reshape(-1, n_teams) + attack
+    perturbed["defs"] = np.asarray(samples["defs"]).reshape(-1, n_teams) + defense
+    perturbed["home"] = np.asarray(samples["home"]).reshape(-1) + scenario.get("home_advantage", 0.0)
+    return perturbed
+
+
+def force_games(schedule_left, results, forced):
+    """
+    Move forced results out of the remaining schedule and into the completed games.
+
+    Parameters:
+    schedule_left (DataFrame): Remaining games
+    results (DataFrame): Completed games
+    forced (list): Games as {"home", "away", "home_goals", "away_goals", optional "date" and "overtime"}
+
+    Returns:
+    tuple: (schedule_left, results) with the forced games moved across
+    """
+    if not forced:
+        return schedule_left, results
+
+    schedule_left = schedule_left.copy()
+    played = []
+    for game in forced:
+        home_ix, away_ix = _team(game["home"]), _team(game["away"])
+        if game["home_goals"] == game["away_goals"]:
+            raise ValueError(f"Forced game {game['home']} vs {game['away']} needs a winner, include any OT/SO goal")
+        match = (schedule_left['home_ix'] == home_ix) & (schedule_left['away_ix'] == away_ix)
+        if "date" in game:
+            match &= pd.to_datetime(schedule_left['Date']) == pd.Timestamp(game["date"])
+        if not match.any():
+            raise ValueError(f"No remaining game {game['home']} vs {game['away']} {game.get('date', '')}".strip())
+
+        row = schedule_left[match].iloc[[0]].copy()
+        schedule_left = schedule_left.drop(index=row.index)
+        overtime = game.get("overtime", False)
+        row['G.1'], row['G'] = float(game["home_goals"]), float(game["away_goals"])
+        row['Shootout'] = "OT" if overtime else None
+        #Model scores don't count the deciding OT/SO goal, as in build_data.process_games
+        home_won = game["home_goals"] > game["away_goals"]
+        row['home_score'] = row['G.1'] - (overtime and home_won)
+        row['away_score'] = row['G'] - (overtime and not home_won)
+        played.append(row)
+
+    return schedule_left, pd.concat([results, *played], ignore_index=True)
+
+
+def _posterior_for_decay(results, decay):
+    """Posterior fitted with another decay_factor, kept in its own store next to the main one."""
+    import model_data
+    from posterior import inputs_hash, load_posterior, save_posterior
+
+    if decay is None or decay == model_data.decay_factor:
+        return model_data.get_posterior(results)
+
+    root, ext = os.path.splitext(model_data.posterior_path())
+    path = f"{root}_decay{decay:g}{ext}"
+    data_in, y_1, y_2 = model_data.model_inputs(results)
+    settings = dict(model_data.fit_settings(), decay_factor=decay)
+    input_hash = inputs_hash(data_in, y_1, y_2, **settings)
+
+    samples, meta = load_posterior(path)
+    if samples is None or meta.get("input_hash") != input_hash:
+        if model_data.engine == "nuts":
+            samples = model_data.fit_model(data_in, y_1, y_2, decay_factor=decay).get_samples()
+        else:
+            samples, _ = model_data.fit_approximate(data_in, y_1, y_2, decay_factor=decay)
+        samples = model_data.compact_samples(samples)
+        save_posterior(samples, input_hash, path, settings=settings, fitted=model_data.dt_time)
+    return samples
+
+
+def _batch_key(scenario):
+    """Scenarios sharing a posterior and a schedule are simulated together."""
+    return scenario.get("decay_factor"), json.dumps(scenario.get("games", []), sort_keys=True)
+
+
+def run_scenarios(scenarios, data_hr, date=None, seed=0):
+    """
+    Simulate the rest of the season under every scenario, in as few batches as possible.
+
+    Scenarios that share a posterior and a schedule are stacked along the draw axis and
+    run through one streamed simulation (predictions.iter_goal_chunks and
+    projections.simResults), so the posterior is loaded and the goal kernel compiled once
+    for all of them. Every scenario in the stack gets the same random numbers (common random
+    numbers, see predictions._poisson), so small what-if effects against the baseline aren't
+    swamped by Monte Carlo noise. Forced games shift the schedule, which only partly lines up
+    the random numbers of those scenarios with the baseline. A baseline scenario is always
+    included.
+
+    Parameters:
+    scenarios (list): Scenario dicts, see the top of this file
+    data_hr (DataFrame): Games from build_data.build_games()
+    date (str): Date to stamp the tables with, today by default
+    seed (int): Seed for the simulation
+
+    Returns:
+    DataFrame: Playoff odds, point bands and encoded point samples per scenario and team,
+        with the change in mean points and playoff odds against the baseline
+    """
+    from model_data import prepare_results
+    from playoffs import season_playoff_table
+    from predictions import remaining_schedule
+    from projections import CURRENT_SEASON_START, project_points_streaming
+    from standings import team_totals
+
+    date = date or datetime.date.today().strftime('%Y-%m-%d')
+    scenarios = [{"name": BASELINE}] + [s for s in scenarios if s.get("name") != BASELINE]
+    names = [s["name"] for s in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("Scenario names must be unique")
+
+    results = prepare_results(data_hr)
+    schedule_left = remaining_schedule(data_hr)
+
+    batches = {}
+    for scenario in scenarios:
+        batches.setdefault(_batch_key(scenario), []).append(scenario)
+
+    tables = []
+    for (decay, _), batch in batches.items():
+        samples = _posterior_for_decay(results, decay)
+        batch_schedule, batch_results = force_games(schedule_left, results, batch[0].get("games", []))
+
+        #Stack every scenario's draws so the batch is one simulation, with the random numbers
+        #shared across the stack
+        perturbed = [perturb_samples(samples, scenario) for scenario in batch]
+        n_draws = len(perturbed[0]["atts"])
+        stacked = {site: np.concatenate([p[site] for p in perturbed]) for site in ["atts", "defs", "home", "intercerpt"]}
+        stacked["intercerpt"] = np.asarray(stacked["intercerpt"]).reshape(-1)
+        points, regulation_wins_left = project_points_streaming(
+            batch_schedule, stacked, batch_results, teams, seed, n_scenarios=len(batch)
+        )
+
+        current = batch_results[batch_results['Date'] > CURRENT_SEASON_START]
+        standings = team_totals(current, teams).reset_index()
+        for i, scenario in enumerate(batch):
+            draws = slice(i * n_draws, (i + 1) * n_draws)
+            table = season_playoff_table(
+                points[:, draws], regulation_wins_left[:, draws], standings, batch_schedule, teams, date, seed
+            )
+            table.insert(0, 'scenario', scenario["name"])
+            table['points'] = [encode_histogram(team_points) for team_points in points[:, draws]]
+            tables.append(table)
+
+    odds = pd.concat(tables, ignore_index=True)
+    baseline = odds[odds['scenario'] == BASELINE].set_index('team')
+    odds['mean_points_change'] = odds['mean_points'] - odds['team'].map(baseline['mean_points'])
+    odds['playoff_prob_change'] = odds['playoff_prob'] - odds['team'].map(baseline['playoff_prob'])
+    #Keep the scenarios in the order they were given
+    odds['scenario'] = pd.Categorical(odds['scenario'], categories=names, ordered=True)
+    return odds.sort_values(['scenario', 'team']).reset_index(drop=True).astype({'scenario': str})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare season outcomes under what-if scenarios")
+    parser.add_argument("scenarios", help="JSON file with a list of scenarios")
+    parser.add_argument("--output", default=SCENARIO_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from build_data import build_games
+
+    with open(args.scenarios) as file:
+        scenario_list = json.load(file)
+    odds = run_scenarios(scenario_list, build_games(), seed=args.seed)
+    odds.to_csv(args.output, index=False)
+    print(odds[['scenario', 'team', 'mean_points', 'mean_points_change', 'playoff_prob', 'playoff_prob_change']]
+          .loc[odds['scenario'] != BASELINE].to_string(index=False))
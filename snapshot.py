@@ -0,0 +1,163 @@
+#Read in packages
+import os
+import glob
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from uploader import to_records
+
+#Everything the frontend pages show, precomputed once per run into one static JSON file so a
+#page view is a single cached fetch instead of several table queries and client-side parsing.
+#Bump SNAPSHOT_VERSION whenever the shape changes - frontend/src/snapshot.js checks it.
+SNAPSHOT_VERSION = 1
+
+#Snapshots are written here as snapshot-<content hash>.json, next to a small manifest naming
+#the current one. A hashed file never changes, so it can be cached forever.
+SNAPSHOT_DIR = "data/snapshot"
+MANIFEST_NAME = "latest.json"
+
+#Seconds browsers and the CDN may cache the manifest and the hashed snapshot for
+MANIFEST_CACHE_SECONDS = 60
+SNAPSHOT_CACHE_SECONDS = 31536000
+
+#Teams listed in each of the dashboard's top lists
+TOP_TEAMS = 3
+
+
+def _rounded(df, digits=4):
+    """Round the float columns, which keeps the file small and compresses well."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            #float32 ratings are widened first, or they round to values like 0.12389999628
+            df[col] = df[col].astype(np.float64).round(digits)
+    return df
+
+
+def _points_histogram(team_points):
+    """Simulated final points as the lowest total and a count for every total from there up."""
+    values = np.rint(np.asarray(team_points)).astype(np.int64)
+    if values.size == 0:
+        return {"low": None, "counts": []}
+    low = int(values.min())
+    return {"low": low, "counts": np.bincount(values - low).tolist()}
+
+
+def build_snapshot(team_stats, seasons, team_strengths, playoff_odds, teams, date):
+    """
+    Shape the day's outputs into what each frontend page shows.
+
+    Parameters:
+    team_stats (DataFrame): Full standings table from update_db.create_team_stats_table
+    seasons (tuple): Simulated final points and remaining regulation wins per team and draw
+    team_strengths (DataFrame): Team attack and defense ratings from model_data.team_ratings
+    playoff_odds (DataFrame): Playoff odds table
+    teams (DataFrame): Team information, ordered by team_index
+    date (str): Date of the run
+
+    Returns:
+    dict: JSON-ready snapshot with dashboard, performance and projections sections
+    """
+    points, _ = seasons
+    mean_points = points.mean(axis=1)
+
+    ratings = team_strengths.rename(columns={
+        'Team': 'team', 'Mean Attack Rating': 'attack', 'Mean Defense Rating': 'defense',
+    })[['team', 'attack', 'defense']]
+    ratings = _rounded(ratings)
+
+    #Lower defense ratings mean fewer goals conceded
+    dashboard = {
+        "top_offense": to_records(ratings.nlargest(TOP_TEAMS, 'attack')[['team', 'attack']]),
+        "top_defense": to_records(ratings.nsmallest(TOP_TEAMS, 'defense')[['team', 'defense']]),
+        "top_points": to_records(_rounded(pd.DataFrame({
+            'team': teams['team'].values, 'mean_points': mean_points,
+        }).nlargest(TOP_TEAMS, 'mean_points'), 1)),
+    }
+
+    performance = {
+        "ratings": to_records(ratings.sort_values('team')),
+    }
+
+    standings = team_stats[pd.to_datetime(team_stats['date']) == pd.to_datetime(team_stats['date']).max()]
+    standings = standings.set_index('team_name')
+    odds = _rounded(playoff_odds.drop(columns=['date'], errors='ignore')).set_index('team')
+    projection_rows = []
+    for (_, team), team_points, team_mean in zip(teams[['team', 'division']].iterrows(), points, mean_points):
+        name = team['team']
+        record = standings.loc[name] if name in standings.index else None
+        games_played = 0 if record is None else int(record['wins'] + record['losses'] + record['ot'])
+        projection_rows.append({
+            "team": name,
+            "division": team['division'],
+            "record": None if record is None else {
+                "wins": int(record['wins']),
+                "losses": int(record['losses']),
+                "ot": int(record['ot']),
+                "points": int(record['points']),
+                "regulation_wins": int(record['regulation_wins']),
+                "games_played": games_played,
+                "games_remaining": 82 - games_played,
+            },
+            "mean_points": round(float(team_mean), 2),
+            "points": _points_histogram(team_points),
+            "odds": to_records(odds.loc[[name]])[0] if name in odds.index else None,
+        })
+
+    projections = {
+        "teams": projection_rows,
+    }
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "date": date,
+        "dashboard": dashboard,
+        "performance": performance,
+        "projections": projections,
+    }
+
+
+def serialise_snapshot(snapshot):
+    """
+    Compact JSON of a snapshot and its content hash.
+
+    Returns:
+    tuple: (payload bytes, first 16 hex digits of its sha256)
+    """
+    payload = json.dumps(snapshot, sort_keys=True, separators=(",", ":")).encode()
+    return payload, hashlib.sha256(payload).hexdigest()[:16]
+
+
+def write_snapshot(snapshot, path=SNAPSHOT_DIR):
+    """
+    Write a snapshot and point the manifest at it, removing older snapshots.
+
+    Parameters:
+    snapshot (dict): Output of build_snapshot()
+    path (str): Directory to write to
+
+    Returns:
+    dict: The manifest - version, date, hash and file name of the snapshot
+    """
+    payload, content_hash = serialise_snapshot(snapshot)
+    manifest = {
+        "version": snapshot["version"],
+        "date": snapshot["date"],
+        "hash": content_hash,
+        "file": f"snapshot-{content_hash}.json",
+    }
+
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, manifest["file"]), "wb") as file:
+        file.write(payload)
+    #Swap the manifest in atomically so it never names a file that isn't there yet
+    tmp_path = os.path.join(path, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_NAME))
+
+    for old in glob.glob(os.path.join(path, "snapshot-*.json")):
+        if os.path.basename(old) != manifest["file"]:
+            os.remove(old)
+    return manifest
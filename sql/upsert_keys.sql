@@ -0,0 +1,85 @@
+-- Unique natural keys and database-generated ids needed by uploader.py's upserts.
+-- Run once in the Supabase SQL editor. Remove any duplicate (team, date) rows first.
+
+alter table team_standings add constraint team_standings_team_date_key unique (team_name, date);
+alter table team_strengths add constraint team_strengths_team_date_key unique ("Team", "Date");
+alter table team_points add constraint team_points_team_date_key unique (team, date);
+
+-- Ids used to be assigned by the client from max(id) + 1
+alter table team_standings alter column id add generated by default as identity;
+alter table team_strengths alter column id add generated by default as identity;
+alter table team_points alter column id add generated by default as identity;
+select setval(pg_get_serial_sequence('team_standings', 'id'), coalesce(max(id), 0) + 1, false) from team_standings;
+select setval(pg_get_serial_sequence('team_strengths', 'id'), coalesce(max(id), 0) + 1, false) from team_strengths;
+select setval(pg_get_serial_sequence('team_points', 'id'), coalesce(max(id), 0) + 1, false) from team_points;
+
+create table if not exists team_playoff_odds (
+    id bigint generated by default as identity primary key,
+    team text not null,
+    date date not null,
+    mean_points double precision,
+    points_p05 double precision,
+    points_p25 double precision,
+    points_p50 double precision,
+    points_p75 double precision,
+    points_p95 double precision,
+    division_winner_prob double precision,
+    division_top3_prob double precision,
+    wildcard_prob double precision,
+    playoff_prob double precision,
+    presidents_trophy_prob double precision,
+    division_threshold double precision,
+    wildcard_threshold double precision,
+    clinched_division_spot boolean,
+    clinched_playoffs boolean,
+    eliminated boolean,
+    unique (team, date)
+);
+
+create table if not exists game_predictions (
+    id bigint generated by default as identity primary key,
+    date date not null,
+    home text not null,
+    away text not null,
+    home_win_prob double precision,
+    away_win_prob double precision,
+    home_regulation_win_prob double precision,
+    away_regulation_win_prob double precision,
+    overtime_prob double precision,
+    shootout_prob double precision,
+    expected_home_goals double precision,
+    expected_away_goals double precision,
+    most_likely_score text,
+    home_goal_probs jsonb,
+    away_goal_probs jsonb,
+    unique (date, home, away)
+);
+
+-- Daily posterior summaries from ratings_history.py, pushed as deltas. Indexed so trend
+-- charts can read one team or date range.
+create table if not exists team_rating_history (
+    id bigint generated by default as identity primary key,
+    date date not null,
+    team text not null,
+    team_index integer,
+    attack_mean double precision,
+    attack_sd double precision,
+    attack_hdi_low double precision,
+    attack_hdi_high double precision,
+    defense_mean double precision,
+    defense_sd double precision,
+    defense_hdi_low double precision,
+    defense_hdi_high double precision,
+    home_mean double precision,
+    home_sd double precision,
+    home_hdi_low double precision,
+    home_hdi_high double precision,
+    unique (date, team)
+);
+create index if not exists team_rating_history_team_date_idx on team_rating_history (team, date);
+
+-- Public bucket for the static frontend snapshot from snapshot.py. Files are only written
+-- by the daily job with the service key, anyone can read them.
+insert into storage.buckets (id, name, public)
+values ('snapshots', 'snapshots', true)
+on conflict (id) do nothing;
@@ -0,0 +1,106 @@
+#Read in packages
+import pandas as pd
+import numpy as np
+
+#Cumulative record columns tracked for each team
+STAT_COLUMNS = ['wins', 'regulation_wins', 'losses', 'ot']
+
+
+def team_game_rows(games):
+    """
+    Reshape completed games into one row per team per game.
+
+    Uses the original G/G.1 scores (shootout goal included) to decide the winner and the
+    'Shootout' column to tell OT/SO results from regulation. Tied scores can't be settled
+    and are skipped with a warning.
+
+    Parameters:
+    games (DataFrame): Games with 'Date', 'home_ix', 'away_ix', 'G', 'G.1' and 'Shootout'
+
+    Returns:
+    DataFrame: Columns date, team_index and a 0/1 column per STAT_COLUMNS entry
+    """
+    games = games[games['G'].notna() & games['G.1'].notna()]
+
+    tied = games['G.1'] == games['G']
+    for _, game in games[tied].iterrows():
+        print(f"Warning: Equal score found on {game['Date']}: {game['Home']} vs {game['Visitor']}. Skipping.")
+    games = games[~tied]
+
+    is_ot_so = games['Shootout'].notna().values
+    home_won = (games['G.1'] > games['G']).values
+
+    def rows(team_ix, won):
+        return pd.DataFrame({
+            'date': games['Date'].values,
+            'team_index': team_ix,
+            'wins': won.astype(int),
+            'regulation_wins': (won & ~is_ot_so).astype(int),
+            'losses': (~won & ~is_ot_so).astype(int),
+            'ot': (~won & is_ot_so).astype(int),
+        })
+
+    return pd.concat(
+        [rows(games['home_ix'].values, home_won), rows(games['away_ix'].values, ~home_won)],
+        ignore_index=True,
+    )
+
+
+def team_totals(games, teams_df):
+    """
+    Wins, regulation wins, losses, OT/SO losses and points per team over a set of games.
+
+    Parameters:
+    games (DataFrame): Games as accepted by team_game_rows
+    teams_df (DataFrame): DataFrame containing team information
+
+    Returns:
+    DataFrame: One row per team, indexed by team_index
+    """
+    totals = (
+        team_game_rows(games)
+        .groupby('team_index')[STAT_COLUMNS].sum()
+        .reindex(teams_df['team_index'], fill_value=0)
+    )
+    totals.insert(0, 'team_name', teams_df.set_index('team_index')['team'])
+    totals['points'] = totals['wins'] * 2 + totals['ot']
+    return totals
+
+
+def build_team_stats(data_hr, teams_df):
+    """
+    Cumulative stats for every team on every date with completed games in the latest season.
+
+    Always rebuilt from the games, which takes a fraction of a second, so score corrections
+    on earlier dates are picked up.
+
+    Parameters:
+    data_hr (DataFrame): DataFrame containing game results
+    teams_df (DataFrame): DataFrame containing team information
+
+    Returns:
+    DataFrame: Columns date, team_index, team_name, wins, regulation_wins, losses, ot,
+        points and season, one row per team per date
+    """
+    # Filter for the latest season only
+    latest_season = data_hr['Season'].max()
+    games = data_hr[data_hr['Season'] == latest_season]
+
+    rows = team_game_rows(games)
+    dates = np.sort(rows['date'].unique())
+    team_index = teams_df['team_index'].values
+
+    # Sum each team's results per date, on a full date x team grid so every team has a row
+    daily = (
+        rows.groupby(['date', 'team_index'])[STAT_COLUMNS].sum()
+        .reindex(pd.MultiIndex.from_product([dates, team_index], names=['date', 'team_index']), fill_value=0)
+    )
+    cumulative = daily.groupby(level='team_index').cumsum().reset_index()
+
+    cumulative['date'] = pd.to_datetime(cumulative['date'])
+    cumulative.insert(2, 'team_name', cumulative['team_index'].map(teams_df.set_index('team_index')['team']))
+    # 2 points for each win (regulation or OT/SO) + 1 point for each OT/SO loss
+    cumulative['points'] = cumulative['wins'] * 2 + cumulative['ot']
+    cumulative['season'] = latest_season
+
+    return cumulative
@@ -0,0 +1 @@
+"""Tests of the model and pipeline on synthetic data, run with `python -m pytest` from the repo root."""
@@ -0,0 +1,35 @@
+#Read in packages
+import numpy as np
+import pytest
+import jax
+from jax import random
+from numpyro.infer.util import initialize_model
+from benchmarks.fixtures import synthetic_games
+from model_data import model_and_args, model_inputs, prepare_results
+
+
+@pytest.fixture(scope="module")
+def potentials():
+    """Jitted potential and gradient of both likelihoods on a synthetic season."""
+    data_in, y_1, y_2 = model_inputs(prepare_results(synthetic_games(1000, played_fraction=0.8)))
+    fns = {}
+    for method in ["games", "pairs"]:
+        model_fn, model_args = model_and_args(data_in, y_1, y_2, method)
+        model_info = initialize_model(random.PRNGKey(0), model_fn, model_kwargs=model_args)
+        fns[method] = jax.jit(jax.value_and_grad(model_info.potential_fn))
+    return fns, model_info.param_info.z
+
+
+@pytest.mark.parametrize("point", range(5))
+def test_pair_likelihood_matches_games(potentials, point):
+    fns, z = potentials
+    #Fixed points in the unconstrained space NUTS works in - both models share their latent sites
+    rng = np.random.default_rng(point)
+    params = {site: (0.3 * rng.standard_normal(np.shape(value))).astype(np.float32) for site, value in z.items()}
+
+    games_value, games_grad = fns["games"](params)
+    pairs_value, pairs_grad = fns["pairs"](params)
+
+    np.testing.assert_allclose(pairs_value, games_value, rtol=1e-5)
+    for site in params:
+        np.testing.assert_allclose(pairs_grad[site], games_grad[site], rtol=1e-5, atol=1e-3)
@@ -0,0 +1,21 @@
+#Read in packages
+from benchmarks.fixtures import synthetic_games, synthetic_posterior
+from matchups import slate_table
+from pipeline import content_hash
+from predictions import remaining_schedule
+
+
+def _slate(seed=0):
+    games = synthetic_games(1312, played_fraction=0.5)
+    return slate_table(synthetic_posterior(200, seed=seed), remaining_schedule(games), "2024-01-01")
+
+
+def test_content_hash_of_slate_table():
+    slate = _slate()
+    assert len(slate) > 0
+    assert isinstance(slate['home_goal_probs'].iloc[0], list)
+    #The same content always hashes the same, and changed goal distributions change the hash
+    assert content_hash(slate) == content_hash(_slate())
+    changed = slate.copy()
+    changed.at[0, 'home_goal_probs'] = [0.0] * len(slate['home_goal_probs'].iloc[0])
+    assert content_hash(changed) != content_hash(slate)
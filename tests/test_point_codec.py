@@ -0,0 +1,14 @@
+#Read in packages
+import numpy as np
+from point_codec import decode_points, encode_histogram
+
+
+def test_histogram_round_trip():
+    points = np.random.default_rng(0).poisson(90, size=5000).astype(float)
+    #Histograms keep every sample but not the draw order
+    assert np.array_equal(decode_points(encode_histogram(points)), np.sort(points))
+    assert decode_points(encode_histogram([])).size == 0
+
+
+def test_decodes_original_lists():
+    assert np.array_equal(decode_points("[84.0, 77.0,91.0]"), [84.0, 77.0, 91.0])
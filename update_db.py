@@ -1,9 +1,14 @@
-import subprocess
 import pandas as pd
 import datetime
-from supabase import create_client, Client
 import os
+import json
 import toml
+from pipeline import run_pipeline
+from projections import save_point_samples
+from ratings_history import mark_pushed
+from snapshot import MANIFEST_CACHE_SECONDS, MANIFEST_NAME, SNAPSHOT_CACHE_SECONDS, serialise_snapshot, write_snapshot
+from standings import build_team_stats
+from uploader import SQLiteBackend, SupabaseBackend, Uploader
 
 def load_config():
     # Check if environment variables are available
@@ -24,32 +29,27 @@ def load_config():
         return config
 
 
-config = load_config()
-supabase_url = config["supabase"]["url"]
-supabase_key = config["supabase"]["key"]
+#Set FACEOFF_DRY_RUN=1 to upsert into a local SQLite file instead of Supabase
+DRY_RUN_DB = "data/dry_run.sqlite"
 
-def run_script(script_path):
-    """Function to run a Python script."""
-    subprocess.run(['python', script_path], check=True)
+#One uploader, and so one Supabase client, per run
+_uploader = None
 
-def upload_to_supabase(df, table_name):
-    """Upload DataFrame to Supabase table."""
-
-    supabase: Client = create_client(supabase_url, supabase_key)
-
-    # Query to find the maximum id value
-    result = supabase.table(table_name).select("id").order("id",desc=True).limit(1).execute()
-
-    # Extract the max id value
-    max_id = result.data[0]['id'] if result.data else 0
-    # Add a new 'id' column starting from max_id + 1
-    # Calculate the new 'id' column values
-    new_ids = range(max_id + 1, max_id + 1 + len(df))
-
-    # Insert the 'id' column as the leftmost column
-    df.insert(loc=0, column='id', value=new_ids)
+def get_uploader():
+    """Create the uploader for this run on first use."""
+    global _uploader
+    if _uploader is None:
+        if os.getenv("FACEOFF_DRY_RUN") == "1":
+            backend = SQLiteBackend(DRY_RUN_DB)
+        else:
+            config = load_config()
+            backend = SupabaseBackend(config["supabase"]["url"], config["supabase"]["key"])
+        _uploader = Uploader(backend)
+    return _uploader
 
-    response = supabase.table(table_name).insert(df.to_dict(orient='records')).execute()
+def upload_to_supabase(df, table_name):
+    """Upsert DataFrame into Supabase table, matching existing rows on the table's natural key."""
+    get_uploader().upload(df, table_name)
 
 def create_team_stats_table(data_hr, teams_df):
     """
@@ -63,110 +63,7 @@ def create_team_stats_table(data_hr, teams_df):
     Returns:
     DataFrame: A DataFrame with team stats on each date
     """
-    import pandas as pd
-    import numpy as np
-    
-    # Filter for the latest season only
-    latest_season = data_hr['Season'].max()
-    data_hr = data_hr[data_hr['Season'] == latest_season].copy()
-    
-    # Sort data by date
-    data_hr = data_hr.sort_values('Date')
-    
-    # Create a list to store team stats for each date
-    team_stats_list = []
-    
-    # Initialize a dictionary to track cumulative stats for each team
-    team_cumulative_stats = {}
-    for idx, team_row in teams_df.iterrows():
-        team_idx = team_row['team_index']
-        team_cumulative_stats[team_idx] = {
-            'wins': 0, 
-            'regulation_wins': 0, 
-            'losses': 0, 
-            'ot': 0, 
-            'team_name': team_row['team']
-        }
-    
-    # Get unique dates
-    unique_dates = data_hr['Date'].unique()
-    
-    # Process games date by date
-    for date in unique_dates:
-        # Get games for this date
-        date_games = data_hr[data_hr['Date'] == date]
-        
-        # Process each game
-        for _, game in date_games.iterrows():
-            home_idx = game['home_ix']
-            away_idx = game['away_ix']
-            
-            # Get the original score values
-            home_score = game['G.1']  # Using the original G.1 column
-            away_score = game['G']    # Using the original G column
-            
-            # Check if the game went to overtime/shootout
-            # The 'Shootout' column contains 'OT' for overtime and 'SO' for shootout, blank for regulation
-            is_ot_so = False
-            if 'Shootout' in game.index and pd.notnull(game['Shootout']):
-                is_ot_so = True
-            
-            # Handle potential ties in the data (which should be resolved if it's OT/SO)
-            if home_score == away_score:
-                # In the NHL, ties don't exist anymore, so this is likely a data issue
-                # If it's marked as OT/SO, we need to determine a winner based on other data
-                if is_ot_so:
-                    # Look for other indications of who won in the shootout
-                    # For now, skip these games as they need data correction
-                    print(f"Warning: Equal score found in OT/SO game on {date}: {game['Home']} vs {game['Visitor']}. Skipping.")
-                    continue
-                else:
-                    # This might be a game in progress or other data issue
-                    print(f"Warning: Unexpected tie game found on {date}: {game['Home']} vs {game['Visitor']}. Skipping.")
-                    continue
-            
-            # Update team stats based on game result
-            if home_score > away_score:
-                # Home team won
-                team_cumulative_stats[home_idx]['wins'] += 1
-                if not is_ot_so:
-                    # It's a regulation win
-                    team_cumulative_stats[home_idx]['regulation_wins'] += 1
-                    team_cumulative_stats[away_idx]['losses'] += 1
-                else:
-                    # Away team gets an OT loss
-                    team_cumulative_stats[away_idx]['ot'] += 1
-            elif away_score > home_score:
-                # Away team won
-                team_cumulative_stats[away_idx]['wins'] += 1
-                if not is_ot_so:
-                    # It's a regulation win
-                    team_cumulative_stats[away_idx]['regulation_wins'] += 1
-                    team_cumulative_stats[home_idx]['losses'] += 1
-                else:
-                    # Home team gets an OT loss
-                    team_cumulative_stats[home_idx]['ot'] += 1
-        
-        # After processing all games for this date, append cumulative stats to the list
-        for team_idx, stats in team_cumulative_stats.items():
-            team_stats_list.append({
-                'date': date,
-                'team_index': team_idx,
-                'team_name': stats['team_name'],
-                'wins': stats['wins'],
-                'regulation_wins': stats['regulation_wins'],
-                'losses': stats['losses'],
-                'ot': stats['ot'],
-                # Calculate points: 2 points for each win (regulation or OT/SO) + 1 point for each OT/SO loss
-                'points': (stats['wins'] * 2) + stats['ot'],
-                # Add season for reference
-                'season': latest_season
-            })
-    
-    # Convert the list to a DataFrame
-    team_stats_df = pd.DataFrame(team_stats_list)
-    
-    return team_stats_df
+    return build_team_stats(data_hr, teams_df)
 
 def get_latest_standings(team_stats_df):
     """
@@ -194,45 +91,68 @@ def get_latest_standings(team_stats_df):
     
     return latest_standings
 
-def main():
-    # Run your scripts
-    run_script('build_data.py')
-    #run_script('model_data.py')
-    run_script('projections.py')
+def publish_snapshot(snapshot):
+    """Write the frontend snapshot to data/snapshot and publish it, the hashed file before the manifest."""
+    manifest = write_snapshot(snapshot)
+    payload, _ = serialise_snapshot(snapshot)
+    get_uploader().upload_file(manifest["file"], payload, SNAPSHOT_CACHE_SECONDS)
+    get_uploader().upload_file(MANIFEST_NAME, json.dumps(manifest).encode(), MANIFEST_CACHE_SECONDS)
+    return manifest
 
-    # Load the teams data
-    teams = pd.read_csv("formatting/teams.csv")
-    
-    # Import directly from build_data
-    import build_data
-    data_hr = build_data.data_hr
-    
-    # Create complete team stats table with historical data
-    team_stats_df = create_team_stats_table(data_hr, teams)
-    
+def publish(team_stats_df, seasons, df_ratings, df_projections, playoff_odds, game_predictions, rating_history,
+            snapshot):
+    """
+    Save the day's outputs to data/ and upload them.
+
+    Parameters:
+    team_stats_df (DataFrame): Full standings table from create_team_stats_table
+    seasons (tuple): Simulated final points and remaining regulation wins per team and draw
+    df_ratings (DataFrame): Team attack and defense ratings
+    df_projections (DataFrame): Encoded point projections
+    playoff_odds (DataFrame): Playoff odds table
+    game_predictions (DataFrame): Predictions for the next night's games
+    rating_history (DataFrame): Rating summaries not yet pushed, see ratings_history.py
+    snapshot (dict): Static snapshot for the frontend, see snapshot.py
+    """
     # Save full historical stats to CSV for reference
     team_stats_df.to_csv("data/team_stats_full.csv", index=False)
-    
+
     # Get only the latest standings with today's date
     latest_standings = get_latest_standings(team_stats_df)
-    
-    # Save latest standings to a separate CSV for reference
+
+    # Save the outputs to CSV for reference
     latest_standings.to_csv("data/team_stats_latest.csv", index=False)
-    latest_standings_csv = pd.read_csv("data/team_stats_latest.csv")
-    
-    # Upload only the latest standings (32 records) to Supabase
-    upload_to_supabase(latest_standings_csv, 'team_standings')
+    df_ratings.to_csv("data/team_ratings.csv", index=False)
+    df_projections.to_csv("data/point_projections.csv", index=False)
+    playoff_odds.to_csv("data/playoff_odds.csv", index=False)
+    game_predictions.to_csv("data/game_predictions.csv", index=False)
+    save_point_samples(*seasons)
 
-    # Load the output data 
-    df_ratings = pd.read_csv('data/team_ratings.csv')
+    # Upload only the latest standings (32 records) to Supabase
+    upload_to_supabase(latest_standings, 'team_standings')
 
     #Upload team strengths
     upload_to_supabase(df_ratings, 'team_strengths')
 
-    #Now get df for point projections
-    df_projections = pd.read_csv("data/point_projections.csv")
     #Now upload point projections
     upload_to_supabase(df_projections, 'team_points')
 
+    #Upload the playoff odds summary
+    upload_to_supabase(playoff_odds, 'team_playoff_odds')
+
+    #Upload tonight's game predictions
+    upload_to_supabase(game_predictions, 'game_predictions')
+
+    #Push only the rating summaries upstream doesn't have yet
+    upload_to_supabase(rating_history, 'team_rating_history')
+    mark_pushed(rating_history['date'].unique())
+
+    #Publish the snapshot the frontend pages load
+    publish_snapshot(snapshot)
+
+def main():
+    # Scrape, fit, simulate and upload in one process, skipping stages whose inputs are unchanged
+    run_pipeline(["upload"])
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
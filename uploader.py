@@ -0,0 +1,154 @@
+#Read in packages
+import os
+import json
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+#Natural key of every table we load, rows are upserted on these so re-runs never duplicate.
+#The Supabase tables need a unique constraint on the same columns, see sql/upsert_keys.sql.
+TABLE_KEYS = {
+    'team_standings': ['team_name', 'date'],
+    'team_strengths': ['Team', 'Date'],
+    'team_points': ['team', 'date'],
+    'team_playoff_odds': ['team', 'date'],
+    'game_predictions': ['date', 'home', 'away'],
+    'team_rating_history': ['date', 'team'],
+}
+
+#Public Supabase Storage bucket the frontend snapshot is published to, see snapshot.py
+SNAPSHOT_BUCKET = 'snapshots'
+
+
+def to_records(df):
+    """Convert a DataFrame to JSON-friendly records: ISO dates, Python scalars and None for NaN."""
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime('%Y-%m-%d')
+    df = df.astype(object).where(df.notna(), None)
+    return [
+        {key: value.item() if isinstance(value, np.generic) else value for key, value in row.items()}
+        for row in df.to_dict(orient='records')
+    ]
+
+
+class SupabaseBackend:
+    """Upserts into Supabase through one client reused for the whole run."""
+
+    def __init__(self, url, key):
+        from supabase import create_client
+
+        self.client = create_client(url, key)
+
+    def upsert(self, table_name, records, keys):
+        self.client.table(table_name).upsert(records, on_conflict=",".join(keys)).execute()
+
+    def put_file(self, name, payload, cache_seconds):
+        self.client.storage.from_(SNAPSHOT_BUCKET).upload(
+            name,
+            payload,
+            {"content-type": "application/json", "cache-control": str(cache_seconds), "x-upsert": "true"},
+        )
+
+
+class SQLiteBackend:
+    """
+    Local stand-in for Supabase for dry runs and tests.
+
+    Tables are created on first use with a unique index on the natural key, and rows are
+    upserted with the same semantics as the Supabase backend.
+    """
+
+    def __init__(self, path=":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.con = sqlite3.connect(path)
+
+    def _ensure_table(self, table_name, columns, keys):
+        quoted = ", ".join(f'"{col}"' for col in columns)
+        self.con.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({quoted})')
+        existing = {row[1] for row in self.con.execute(f'PRAGMA table_info("{table_name}")')}
+        for col in columns:
+            if col not in existing:
+                self.con.execute(f'ALTER TABLE "{table_name}" ADD COLUMN "{col}"')
+        key_cols = ", ".join(f'"{col}"' for col in keys)
+        self.con.execute(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "{table_name}_natural_key" ON "{table_name}" ({key_cols})'
+        )
+
+    def upsert(self, table_name, records, keys):
+        if not records:
+            return
+        columns = list(records[0])
+        self._ensure_table(table_name, columns, keys)
+        quoted = ", ".join(f'"{col}"' for col in columns)
+        updates = ", ".join(f'"{col}" = excluded."{col}"' for col in columns if col not in keys)
+        conflict = ", ".join(f'"{col}"' for col in keys)
+        sql = (
+            f'INSERT INTO "{table_name}" ({quoted}) VALUES ({", ".join("?" * len(columns))}) '
+            f'ON CONFLICT ({conflict}) DO ' + (f'UPDATE SET {updates}' if updates else 'NOTHING')
+        )
+        #Lists and dicts are stored as JSON text, as Supabase stores them in jsonb columns
+        rows = [
+            tuple(json.dumps(value) if isinstance(value, (list, dict)) else value for value in map(record.get, columns))
+            for record in records
+        ]
+        with self.con:
+            self.con.executemany(sql, rows)
+
+    def read(self, table_name):
+        return pd.read_sql_query(f'SELECT * FROM "{table_name}"', self.con)
+
+    def put_file(self, name, payload, cache_seconds):
+        self.con.execute('CREATE TABLE IF NOT EXISTS "_files" ("name" PRIMARY KEY, "payload", "cache_seconds")')
+        with self.con:
+            self.con.execute('INSERT OR REPLACE INTO "_files" VALUES (?, ?, ?)', (name, payload, cache_seconds))
+
+    def read_file(self, name):
+        row = self.con.execute('SELECT "payload" FROM "_files" WHERE "name" = ?', (name,)).fetchone()
+        return None if row is None else row[0]
+
+
+class Uploader:
+    """
+    Chunked, retried upserts of DataFrames keyed on each table's natural key.
+
+    Parameters:
+    backend: SupabaseBackend or SQLiteBackend
+    chunk_size (int): Rows per request
+    max_retries (int): Attempts per chunk before giving up
+    backoff (float): Seconds to wait after the first failure, doubled on every retry
+    """
+
+    def __init__(self, backend, chunk_size=500, max_retries=4, backoff=1.0):
+        self.backend = backend
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def upload(self, df, table_name):
+        """Upsert a DataFrame into a table, one chunk at a time."""
+        keys = TABLE_KEYS[table_name]
+        # Client-side ids are left to the database, rows are matched on the natural key
+        df = df.drop(columns=['id'], errors='ignore').drop_duplicates(subset=keys, keep='last')
+        records = to_records(df)
+        for start in range(0, len(records), self.chunk_size):
+            self._with_retries(table_name, self.backend.upsert, table_name, records[start:start + self.chunk_size], keys)
+        return len(records)
+
+    def upload_file(self, name, payload, cache_seconds):
+        """Publish a static JSON file, replacing any with the same name."""
+        self._with_retries(name, self.backend.put_file, name, payload, cache_seconds)
+
+    def _with_retries(self, target, func, *args):
+        for attempt in range(self.max_retries):
+            try:
+                return func(*args)
+            except Exception as err:
+                if attempt == self.max_retries - 1:
+                    raise
+                wait = self.backoff * 2 ** attempt
+                print(f"Upload to {target} failed ({err}), retrying in {wait:.0f}s")
+                time.sleep(wait)